@@ -80,6 +80,8 @@ def main():
     print(f"服务地址: ws://{settings.HOST}:{settings.PORT}")
     print(f"音频格式: WAV")
     print(f"合成参数: 语速={settings.RATE}, 音量={settings.VOLUME}")
+    print(f"合成后端: {settings.TTS_BACKEND}")
+    print(f"合成工作进程: {settings.WORKER_COUNT}, 引擎池大小: {settings.ENGINE_POOL_SIZE}")
     print(f"运行平台: {platform.system()} {platform.release()}")
     print("=" * 50)
 
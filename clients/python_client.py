@@ -1,8 +1,14 @@
 # clients/python_client.py
 import asyncio
+import os
+import sys
 import websockets
 import json
 
+# 二进制帧格式与服务端共用 core/protocol.py 中的定义
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.protocol import AUDIO_TRANSPORT_BINARY, unpack_audio_frame
+
 
 async def test_tts_service():
     uri = "ws://localhost:8765"
@@ -12,6 +18,10 @@ async def test_tts_service():
         welcome = await websocket.recv()
         print("服务端响应:", welcome)
 
+        # 协商使用二进制音频帧
+        await websocket.send(json.dumps({"type": "configure", "audio_transport": AUDIO_TRANSPORT_BINARY}))
+        print("传输方式:", json.loads(await websocket.recv())["audio_transport"])
+
         # 发送合成请求
         request = {
             "type": "synthesize",
@@ -22,15 +32,22 @@ async def test_tts_service():
         await websocket.send(json.dumps(request))
         print("已发送合成请求")
 
+        audio = bytearray()
+
         # 接收响应
         async for message in websocket:
+            if isinstance(message, bytes):
+                stream_id, chunk_index, flags, chunk = unpack_audio_frame(message)
+                audio += chunk
+                continue
+
             data = json.loads(message)
             print(f"收到消息类型: {data['type']}")
 
             if data['type'] == 'synthesis_complete':
-                print("合成完成!")
+                print(f"合成完成! 音频大小: {len(audio)} 字节")
                 break
 
 
 if __name__ == "__main__":
-    asyncio.run(test_tts_service())
\ No newline at end of file
+    asyncio.run(test_tts_service())
@@ -1,5 +1,6 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict
 
 @dataclass
 class TTSSettings:
@@ -11,6 +12,55 @@ class TTSSettings:
     VOICE_INDEX: int = 0
     CHUNK_SIZE: int = 4096
     MAX_MESSAGE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    WS_WRITE_BUFFER_HIGH: int = 256 * 1024  # 写缓冲区高水位，超过后暂停发送
+    WS_WRITE_BUFFER_LOW: int = 64 * 1024  # 写缓冲区低水位，回落到此后恢复发送
+    MAX_CONCURRENT_REQUESTS_PER_CONNECTION: int = 4  # 单个连接上同时进行的合成请求数上限
+    SEND_TIMEOUT: float = 30.0  # 单条消息等待写出的最长时间（秒），超时视为客户端过慢
+    SEND_YIELD_EVERY_CHUNKS: int = 8  # 每发送多少个音频块主动让出一次事件循环，保证多个连接交错发送，0表示不主动让出
+    TTS_BACKEND: str = "pyttsx3"  # 合成后端：pyttsx3（经临时文件），espeak-ng（直接调用 libespeak-ng 取得PCM），espeak-ng-process（espeak-ng 子进程从stdout输出）
+    ESPEAK_LIBRARY: str = ""  # libespeak-ng 动态库路径，空表示自动查找
+    ESPEAK_EXECUTABLE: str = "espeak-ng"  # espeak-ng-process 后端使用的可执行文件，并发数同 WORKER_COUNT
+    ENGINE_POOL_SIZE: int = 1  # 预初始化引擎数量（espeak驱动下进程内只能串行合成）
+    ENGINE_POOL_ACQUIRE_TIMEOUT: float = 30.0  # 等待空闲引擎的超时时间（秒）
+    WORKER_COUNT: int = os.cpu_count() or 1  # 合成工作进程数量，0表示在服务进程内用引擎池合成
+    WORKER_START_TIMEOUT: float = 30.0  # 工作进程启动（引擎初始化）超时时间（秒）
+    WORKER_JOB_TIMEOUT: float = 10.0  # 单个合成任务的基础超时时间（秒），超时后终止并重启工作进程
+    WORKER_JOB_TIMEOUT_PER_CHAR: float = 0.2  # 合成任务超时时间按字符数增加的秒数
+    WORKER_MAX_JOBS: int = 1000  # 工作进程处理多少个任务后轮换，0表示不限制
+    WORKER_MAX_RSS_MB: int = 512  # 工作进程常驻内存超过此值（MB）后轮换，0表示不限制
+    WORKER_RESTART_BACKOFF: float = 1.0  # 工作进程重启失败后首次重试的等待时间（秒），之后逐次加倍
+    WORKER_RESTART_BACKOFF_MAX: float = 30.0  # 工作进程重启重试的最长等待时间（秒）
+    TEMP_AUDIO_TMPFS_DIR: str = "/dev/shm"  # 引擎输出临时音频优先使用的内存文件系统目录
+    TEMP_AUDIO_FALLBACK_DIR: str = ""  # 内存文件系统不可用时的临时目录，空表示系统临时目录
+    TEMP_AUDIO_MAX_AGE: float = 600.0  # 临时音频超过此时间（秒）未修改视为遗留文件并清理
+    TEMP_AUDIO_SWEEP_INTERVAL: float = 60.0  # 遗留临时文件清理间隔（秒），0表示不清理
+    SEGMENT_MAX_CHARS: int = 120  # 分段合成时每段的最大字符数
+    FIRST_SEGMENT_MAX_CHARS: int = 40  # 首段最大字符数，越短首包延迟越低
+    SEGMENT_PARALLELISM: int = 0  # 单个请求同时合成的片段数，0表示与合成并发能力一致
+    PROGRESSIVE_STREAMING: bool = False  # 首段在引擎写入文件的过程中就开始输出（适用于边合成边写文件的驱动）
+    PROGRESSIVE_POLL_INTERVAL: float = 0.02  # 渐进输出时检查输出文件增长的间隔（秒）
+    BATCH_WINDOW: float = 0.01  # 短片段微批处理的收集窗口（秒），0表示关闭
+    BATCH_MAX_CHARS: int = 40  # 不超过此字符数的片段参与微批处理
+    BATCH_MAX_ITEMS: int = 8  # 单批最多片段数
+    SCHEDULER_AGING_SECONDS: float = 5.0  # 等待多久后优先级提升一个等级，防止后台任务饿死
+    MAX_QUEUE_DEPTH: int = 64  # 同时未完成的合成请求数上限，超过后拒绝新请求
+    MAX_ESTIMATED_WAIT: float = 30.0  # 新请求预计等待时间上限（秒），超过后拒绝
+    ESTIMATED_SECONDS_PER_CHAR: float = 0.01  # 耗时模型的初始每字符秒数，运行中按实际耗时校准
+    COST_MODEL_OVERHEAD: float = 0.2  # 耗时模型的初始单次合成固定开销（秒）
+    COST_MODEL_DECAY: float = 0.98  # 耗时模型对历史样本的衰减系数，越小越偏重近期样本
+    HEDGE_PERCENTILE: float = 0.95  # 片段合成超过该分位数的耗时仍未完成时对冲派发到另一工作进程，0表示关闭
+    HEDGE_MIN_SAMPLES: int = 20  # 开始对冲前至少需要的耗时样本数
+    HEDGE_SAMPLE_WINDOW: int = 500  # 计算耗时分位数使用的近期样本数
+    HEDGE_MIN_DELAY: float = 0.05  # 对冲等待时间下限（秒）
+    SJF_REFERENCE_SECONDS: float = 2.0  # 同一优先级内短任务优先的参考耗时，越小越偏向短任务
+    TENANT_WEIGHTS: Dict[str, float] = field(default_factory=dict)  # 各租户（API key）的公平调度权重
+    DEFAULT_TENANT_WEIGHT: float = 1.0  # 未配置权重的租户（含按连接区分的匿名租户）的权重
+    FAIR_QUEUE_QUANTUM_SECONDS: float = 1.0  # 租户间轮转调度每轮发放的合成时间额度（秒），乘以权重，0表示按队首任务轮流放行
+    AUDIO_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 内存音频缓存容量，0表示关闭
+    AUDIO_CACHE_MAX_ITEM_BYTES: int = 16 * 1024 * 1024  # 单条音频超过此大小不缓存
+    DISK_CACHE_DIR: str = "audio_cache"  # 磁盘音频缓存目录，可被同一主机上的多个服务进程共享
+    DISK_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 磁盘缓存容量，0表示关闭
+    DISK_CACHE_TTL: float = 7 * 24 * 3600  # 磁盘缓存条目有效期（秒），0表示不过期
 
 # 全局配置实例
 settings = TTSSettings()
\ No newline at end of file
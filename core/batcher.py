@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+from config.settings import settings
+from core.scheduler import SynthesisJob
+
+
+@dataclass
+class BatchItem:
+    text: str
+    job: SynthesisJob
+    future: asyncio.Future
+
+
+class MicroBatcher:
+    """
+    短片段微批处理
+    在短时间窗口内收集相同语音参数的短片段，交给一次引擎运行分别合成，
+    省去每个短句单独启动引擎运行循环的固定开销，结果再分发回各自的请求。
+    """
+
+    def __init__(self, render: Callable[[List[BatchItem]], Awaitable[List[Any]]],
+                 window=settings.BATCH_WINDOW, max_items=settings.BATCH_MAX_ITEMS):
+        """
+        Args:
+            render: 合成一批片段的协程函数，按顺序返回每个片段的结果或异常
+            window: 收集窗口（秒），从批次中第一个片段到达时开始计时
+            max_items: 单批最多片段数，达到后立即合成
+        """
+        self._render = render
+        self.window = window
+        self.max_items = max(1, max_items)
+        self.logger = logging.getLogger(__name__)
+        self._pending: Dict[Hashable, List[BatchItem]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._items = 0
+
+    def has_pending(self, key: Hashable) -> bool:
+        """是否有正在收集中的批次"""
+        return key in self._pending
+
+    async def submit(self, key: Hashable, text: str, job: SynthesisJob) -> Any:
+        """加入 key 对应的批次并等待该片段的合成结果"""
+        loop = asyncio.get_running_loop()
+        item = BatchItem(text, job, loop.create_future())
+        batch = self._pending.setdefault(key, [])
+        batch.append(item)
+        if len(batch) >= self.max_items:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await item.future
+
+    def _flush(self, key: Hashable):
+        """结束收集，把批次交给后台任务合成；已取消的片段不再合成"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = [item for item in self._pending.pop(key, []) if not item.future.done()]
+        if not items:
+            return
+
+        self._batches += 1
+        self._items += len(items)
+        task = asyncio.ensure_future(self._run(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items: List[BatchItem]):
+        try:
+            results = await self._render(items)
+        except asyncio.CancelledError:
+            for item in items:
+                item.future.cancel()
+            raise
+        except Exception as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for item, result in zip(items, results):
+            if item.future.done():
+                continue
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取批处理统计"""
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "average_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "collecting": sum(len(items) for items in self._pending.values())
+        }
@@ -0,0 +1,90 @@
+import threading
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from config.settings import settings
+
+CacheKey = Tuple[str, str, str, int, float, str]
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：统一全半角形式并折叠空白，使等价文本命中同一缓存项"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def make_cache_key(text: str, backend: str, voice: str, rate: int, volume: float,
+                   output_format: str = "wav") -> CacheKey:
+    """
+    生成缓存键：(规范化文本, 合成后端, 语音标识, 语速, 音量, 输出格式)
+    不同后端的音频和语音列表顺序都不同，因此键中包含后端和解析后的语音标识而不是语音序号。
+    """
+    return (normalize_text(text), backend, voice, rate, round(volume, 3), output_format)
+
+
+class AudioCache:
+    """
+    按字节数限制容量的内存LRU音频缓存
+    """
+
+    def __init__(self, max_bytes=settings.AUDIO_CACHE_MAX_BYTES,
+                 max_item_bytes=settings.AUDIO_CACHE_MAX_ITEM_BYTES):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.logger = logging.getLogger(__name__)
+        self._items: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        """读取缓存，命中时移动到最近使用位置"""
+        with self._lock:
+            audio = self._items.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, key: CacheKey, audio: bytes) -> bool:
+        """写入缓存，超出容量时淘汰最久未使用的条目；单项过大时不缓存"""
+        size = len(audio)
+        if self.max_bytes <= 0 or size > min(self.max_item_bytes, self.max_bytes):
+            return False
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+
+            self._items[key] = audio
+            self._size += size
+
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._items),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
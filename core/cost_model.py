@@ -0,0 +1,104 @@
+import threading
+from collections import deque
+from typing import Dict, Any, Hashable, List, Optional
+from config.settings import settings
+
+
+class _VoiceCost:
+    """单个语音的线性耗时模型：秒数 = 固定开销 + 每字符耗时 × 字符数"""
+
+    def __init__(self, overhead: float, per_char: float):
+        self.overhead = overhead
+        self.per_char = per_char
+        self.samples = 0
+        # 指数衰减加权的回归统计量
+        self._w = self._x = self._y = self._xx = self._xy = 0.0
+
+    def observe(self, chars: int, seconds: float, decay: float):
+        self.samples += 1
+        self._w = self._w * decay + 1.0
+        self._x = self._x * decay + chars
+        self._y = self._y * decay + seconds
+        self._xx = self._xx * decay + chars * chars
+        self._xy = self._xy * decay + chars * seconds
+
+        mean_x = self._x / self._w
+        mean_y = self._y / self._w
+        var_x = self._xx / self._w - mean_x * mean_x
+        if var_x > 1.0:
+            # 字符数有足够差异时做加权最小二乘拟合
+            per_char = (self._xy / self._w - mean_x * mean_y) / var_x
+            overhead = mean_y - per_char * mean_x
+            if per_char > 0 and overhead >= 0:
+                self.per_char, self.overhead = per_char, overhead
+                return
+
+        # 样本长度相近时只校准每字符耗时，保留固定开销
+        if mean_x > 0:
+            self.per_char = max(0.0, mean_y - self.overhead) / mean_x
+
+    def estimate(self, chars: int) -> float:
+        return self.overhead + self.per_char * chars
+
+
+class CostModel:
+    """
+    合成耗时模型
+    根据实际合成耗时按语音分别校准，用于调度器估算排队等待和优先放行短任务。
+    同时记录近期实际耗时与估算值之比，用其分位数判断单次合成是否异常缓慢。
+    """
+
+    def __init__(self, overhead=settings.COST_MODEL_OVERHEAD, per_char=settings.ESTIMATED_SECONDS_PER_CHAR,
+                 decay=settings.COST_MODEL_DECAY):
+        self.default_overhead = overhead
+        self.default_per_char = per_char
+        self.decay = decay
+        self._voices: Dict[Hashable, _VoiceCost] = {}
+        self._lock = threading.Lock()
+        self._slowdowns: deque = deque(maxlen=settings.HEDGE_SAMPLE_WINDOW)
+
+    def _voice(self, voice: Hashable) -> _VoiceCost:
+        model = self._voices.get(voice)
+        if model is None:
+            model = self._voices[voice] = _VoiceCost(self.default_overhead, self.default_per_char)
+        return model
+
+    def observe(self, voice: Hashable, chars: int, seconds: float):
+        """记录一次实际合成的字符数和耗时"""
+        with self._lock:
+            model = self._voice(voice)
+            expected = model.estimate(chars)
+            if expected > 0:
+                self._slowdowns.append(seconds / expected)
+            model.observe(chars, seconds, self.decay)
+
+    def slowdown_quantile(self, q: float) -> Optional[float]:
+        """近期实际耗时/估算耗时的 q 分位数，样本不足时返回None"""
+        with self._lock:
+            if len(self._slowdowns) < settings.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._slowdowns)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def estimate(self, voice: Hashable, chars: int) -> float:
+        """估算合成指定字符数所需的秒数"""
+        if chars <= 0:
+            return 0.0
+        with self._lock:
+            model = self._voices.get(voice)
+        if model is None:
+            return self.default_overhead + self.default_per_char * chars
+        return model.estimate(chars)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """获取各语音的校准参数"""
+        with self._lock:
+            return [
+                {
+                    "voice": list(voice) if isinstance(voice, tuple) else voice,
+                    "overhead": round(model.overhead, 4),
+                    "per_char": round(model.per_char, 5),
+                    "samples": model.samples
+                }
+                for voice, model in self._voices.items()
+            ]
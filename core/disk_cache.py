@@ -0,0 +1,184 @@
+import os
+import mmap
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+from config.settings import settings
+from core.cache import CacheKey
+
+
+class CachedAudio:
+    """
+    通过 mmap 映射的缓存音频
+    view 为只读 memoryview，可直接切片送入发送循环；用完需调用 close()。
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, 'MADV_WILLNEED'):
+            # 在打开映射的线程中提前读入页面，避免发送循环切片时在事件循环线程上触发缺页读盘
+            self._mmap.madvise(mmap.MADV_WILLNEED)
+        self.view = memoryview(self._mmap)
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def close(self):
+        try:
+            self.view.release()
+            self._mmap.close()
+        except BufferError:
+            # 仍有切片在使用中，映射会在最后一个引用释放时自动关闭
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DiskAudioCache:
+    """
+    持久化的内容寻址磁盘音频缓存
+    文件按合成参数的哈希存放，索引保存在 SQLite 中；写入使用临时文件加原子替换，
+    同一主机上的多个服务进程可以安全共享同一缓存目录。
+    """
+
+    def __init__(self, directory=settings.DISK_CACHE_DIR, max_bytes=settings.DISK_CACHE_MAX_BYTES,
+                 ttl=settings.DISK_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=10,
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "digest TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self.logger.info(f"✓ 磁盘音频缓存已启用: {self.directory}")
+
+    @staticmethod
+    def digest(key: CacheKey) -> str:
+        """合成参数的内容哈希"""
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest + ".wav")
+
+    def get(self, key: CacheKey) -> Optional[CachedAudio]:
+        """读取缓存条目（阻塞调用），未命中或已过期时返回None"""
+        digest = self.digest(key)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT created FROM entries WHERE digest = ?", (digest,)).fetchone()
+            if row is None or (self.ttl > 0 and now - row[0] > self.ttl):
+                self.misses += 1
+                if row is not None:
+                    self._remove(digest)
+                return None
+
+            try:
+                audio = CachedAudio(self._path(digest))
+            except (OSError, ValueError):
+                # 文件被其他进程淘汰或损坏，清理索引
+                self.misses += 1
+                self._remove(digest)
+                return None
+
+            self._db.execute("UPDATE entries SET accessed = ? WHERE digest = ?", (now, digest))
+            self.hits += 1
+            return audio
+
+    def put(self, key: CacheKey, audio: bytes):
+        """写入缓存条目（阻塞调用）"""
+        if self.max_bytes <= 0 or len(audio) > self.max_bytes:
+            return
+
+        digest = self.digest(key)
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # Windows 下文件被映射时无法替换，已有内容相同，直接放弃本次写入
+            self.logger.warning(f"写入磁盘缓存失败: {e}")
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (digest, size, created, accessed) VALUES (?, ?, ?, ?)",
+                (digest, len(audio), now, now)
+            )
+            self._evict(now)
+
+    def _remove(self, digest: str) -> bool:
+        """删除条目文件和索引，调用方需持有锁"""
+        try:
+            os.unlink(self._path(digest))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # 文件仍被映射（Windows），保留到下次淘汰
+            return False
+        self._db.execute("DELETE FROM entries WHERE digest = ?", (digest,))
+        return True
+
+    def _evict(self, now: float):
+        """淘汰过期条目，并按最近访问时间淘汰直到总大小不超过上限，调用方需持有锁"""
+        if self.ttl > 0:
+            expired = self._db.execute("SELECT digest FROM entries WHERE created < ?", (now - self.ttl,)).fetchall()
+            for (digest,) in expired:
+                if self._remove(digest):
+                    self.evictions += 1
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for digest, size in self._db.execute("SELECT digest, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            if self._remove(digest):
+                total -= size
+                self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取磁盘缓存统计"""
+        with self._lock:
+            items, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return {
+                "items": items,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
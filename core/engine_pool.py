@@ -0,0 +1,161 @@
+import pyttsx3
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Any, List
+from config.settings import settings
+
+
+class EnginePoolExhausted(Exception):
+    """在超时时间内没有可用的引擎"""
+
+
+class EnginePool:
+    """
+    预初始化、可复用的pyttsx3引擎池
+    每个合成任务借出一个引擎，完成后归还；出错或健康检查失败的引擎会被重建。
+    注意：espeak驱动在进程内共享同一个libespeak实例，多引擎并不能并行合成，
+    此时应保持池大小为1，并通过多进程工作池扩展并发。
+    """
+
+    def __init__(self, size=settings.ENGINE_POOL_SIZE, rate=settings.RATE,
+                 volume=settings.VOLUME, voice_index=settings.VOICE_INDEX):
+        self.size = max(1, size)
+        self.rate = rate
+        self.volume = volume
+        self.voice_index = voice_index
+        self.logger = logging.getLogger(__name__)
+        self.voices: List[Dict[str, Any]] = []
+        self._idle: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._rebuilds = 0
+        self._closed = False
+
+        for _ in range(self.size):
+            self._idle.put(self._create_engine())
+
+        self.logger.info(f"✓ 引擎池初始化完成，大小: {self.size}")
+
+    def _create_engine(self):
+        """创建并配置一个独立的引擎实例"""
+        # pyttsx3.init() 会按驱动名缓存引擎，这里直接构造以保证池内实例互相独立
+        engine = pyttsx3.Engine()
+        engine.setProperty('rate', self.rate)
+        engine.setProperty('volume', self.volume)
+
+        voices = engine.getProperty('voices') or []
+        if len(voices) > self.voice_index:
+            engine.setProperty('voice', voices[self.voice_index].id)
+
+        if not self.voices:
+            self.voices = [{"id": i, "name": v.name} for i, v in enumerate(voices)]
+            self.logger.info(f"可用语音数量: {len(voices)}")
+            for i, voice in enumerate(voices):
+                self.logger.info(f"语音 {i}: {voice.name}")
+
+        return engine
+
+    def _is_healthy(self, engine) -> bool:
+        """健康检查：引擎能正常响应属性查询且没有残留任务"""
+        try:
+            engine.getProperty('rate')
+            return not engine.isBusy()
+        except Exception:
+            return False
+
+    def _discard(self, engine):
+        try:
+            engine.stop()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=settings.ENGINE_POOL_ACQUIRE_TIMEOUT):
+        """借出一个健康的引擎"""
+        if self._closed:
+            raise RuntimeError("引擎池已关闭")
+
+        try:
+            engine = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise EnginePoolExhausted(f"等待引擎超时({timeout}秒)")
+
+        if not self._is_healthy(engine):
+            self.logger.warning("⚠️ 引擎健康检查失败，正在重建")
+            self._discard(engine)
+            try:
+                engine = self._create_engine()
+            except Exception:
+                # 重建失败时保持池容量不变，下次借出时再尝试
+                self._idle.put(engine)
+                raise
+            with self._lock:
+                self._rebuilds += 1
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            in_use = self._in_use
+
+        self.logger.info(f"引擎池使用率: {in_use}/{self.size}")
+        return engine
+
+    def release(self, engine, healthy=True):
+        """归还引擎；不健康的引擎会被替换"""
+        with self._lock:
+            self._in_use -= 1
+
+        if self._closed:
+            self._discard(engine)
+            return
+
+        if not healthy:
+            self.logger.warning("⚠️ 归还的引擎状态异常，正在重建")
+            self._discard(engine)
+            try:
+                engine = self._create_engine()
+                with self._lock:
+                    self._rebuilds += 1
+            except Exception as e:
+                # 放回旧实例，下一次借出时的健康检查会再次尝试重建
+                self.logger.error(f"❌ 引擎重建失败: {e}")
+
+        self._idle.put(engine)
+
+    @contextmanager
+    def engine(self, timeout=settings.ENGINE_POOL_ACQUIRE_TIMEOUT):
+        """以上下文管理器方式借出引擎"""
+        engine = self.acquire(timeout)
+        healthy = True
+        try:
+            yield engine
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            self.release(engine, healthy)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取引擎池使用情况"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self.size - self._in_use,
+                "utilization": round(self._in_use / self.size, 3),
+                "checkouts": self._checkouts,
+                "rebuilds": self._rebuilds
+            }
+
+    def close(self):
+        """关闭引擎池"""
+        self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(engine)
+        self.logger.info("引擎池已关闭")
@@ -0,0 +1,165 @@
+import ctypes
+import ctypes.util
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from config.settings import settings
+from core.wav import WavFormat
+
+BACKEND_PYTTSX3 = "pyttsx3"
+BACKEND_ESPEAK = "espeak-ng"
+BACKEND_ESPEAK_PROCESS = "espeak-ng-process"
+
+# speak_lib.h 中的常量
+_AUDIO_OUTPUT_SYNCHRONOUS = 2
+_POS_CHARACTER = 1
+_CHARS_UTF8 = 1
+_ENDPAUSE = 0x1000
+_EE_OK = 0
+_ESPEAK_RATE = 1
+_ESPEAK_VOLUME = 2
+
+
+class EspeakError(Exception):
+    """libespeak-ng 加载或调用失败"""
+
+
+class _EspeakVoice(ctypes.Structure):
+    _fields_ = [
+        ("name", ctypes.c_char_p),
+        ("languages", ctypes.c_char_p),
+        ("identifier", ctypes.c_char_p),
+        ("gender", ctypes.c_ubyte),
+        ("age", ctypes.c_ubyte),
+        ("variant", ctypes.c_ubyte),
+        ("xx1", ctypes.c_ubyte),
+        ("score", ctypes.c_int),
+        ("spare", ctypes.c_void_p),
+    ]
+
+
+# int SynthCallback(short *wav, int numsamples, espeak_EVENT *events)
+_SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+
+
+def _load_library(path: str = "") -> ctypes.CDLL:
+    candidates = [path] if path else []
+    candidates += [ctypes.util.find_library("espeak-ng"), "libespeak-ng.so.1",
+                   ctypes.util.find_library("espeak"), "libespeak.so.1"]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            return ctypes.CDLL(candidate)
+        except OSError:
+            continue
+    raise EspeakError("找不到 libespeak-ng，请安装 libespeak-ng1")
+
+
+class EspeakEngine:
+    """
+    直接绑定 libespeak-ng 的合成引擎
+    使用同步输出模式，合成过程中通过回调逐块取得PCM，不经过临时文件。
+    libespeak-ng 的状态是进程级的，同一进程内只能有一个实例并串行合成，
+    需要并发时通过多进程工作池扩展。
+    """
+
+    size = 1
+
+    def __init__(self, rate=settings.RATE, volume=settings.VOLUME, voice_index=settings.VOICE_INDEX,
+                 library=settings.ESPEAK_LIBRARY):
+        self.logger = logging.getLogger(__name__)
+        self._lib = lib = _load_library(library)
+        lib.espeak_Initialize.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        lib.espeak_Initialize.restype = ctypes.c_int
+        lib.espeak_SetSynthCallback.argtypes = [_SYNTH_CALLBACK]
+        lib.espeak_SetSynthCallback.restype = None
+        lib.espeak_Synth.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int,
+                                     ctypes.c_uint, ctypes.c_uint, ctypes.POINTER(ctypes.c_uint), ctypes.c_void_p]
+        lib.espeak_Synth.restype = ctypes.c_int
+        lib.espeak_SetParameter.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        lib.espeak_SetParameter.restype = ctypes.c_int
+        lib.espeak_SetVoiceByName.argtypes = [ctypes.c_char_p]
+        lib.espeak_SetVoiceByName.restype = ctypes.c_int
+        lib.espeak_ListVoices.argtypes = [ctypes.c_void_p]
+        lib.espeak_ListVoices.restype = ctypes.POINTER(ctypes.POINTER(_EspeakVoice))
+        lib.espeak_Terminate.restype = ctypes.c_int
+
+        sample_rate = lib.espeak_Initialize(_AUDIO_OUTPUT_SYNCHRONOUS, 0, None, 0)
+        if sample_rate <= 0:
+            raise EspeakError("libespeak-ng 初始化失败")
+        self.format = WavFormat(channels=1, sample_width=2, framerate=sample_rate)
+
+        # 回调对象必须一直被引用，否则会被回收
+        self._callback = _SYNTH_CALLBACK(self._on_synth)
+        lib.espeak_SetSynthCallback(self._callback)
+        self._lock = threading.Lock()
+        self._sink: Optional[Callable[[bytes], None]] = None
+        self._should_stop: Optional[Callable[[], bool]] = None
+        self._completed = 0
+        self._aborted = 0
+
+        self.voices = self._list_voices()
+        self.logger.info(f"可用语音数量: {len(self.voices)}")
+        if len(self.voices) > voice_index:
+            lib.espeak_SetVoiceByName(self.voices[voice_index]["name"].encode("utf-8"))
+        lib.espeak_SetParameter(_ESPEAK_RATE, int(rate), 0)
+        # pyttsx3 的音量范围是 0~1，espeak 以 100 为正常音量
+        lib.espeak_SetParameter(_ESPEAK_VOLUME, int(volume * 100), 0)
+        self.logger.info(f"✓ libespeak-ng 引擎初始化完成，采样率: {sample_rate}")
+
+    def _list_voices(self) -> List[Dict[str, Any]]:
+        voices = []
+        entries = self._lib.espeak_ListVoices(None)
+        i = 0
+        while entries and entries[i]:
+            voice = entries[i].contents
+            voices.append({"id": i, "name": (voice.name or b"").decode("utf-8", "replace")})
+            i += 1
+        return voices
+
+    def _on_synth(self, wav, numsamples, events) -> int:
+        if wav and numsamples > 0 and self._sink is not None:
+            self._sink(ctypes.string_at(wav, numsamples * self.format.sample_width))
+        # 返回1让 libespeak-ng 中止本次合成
+        return 1 if self._should_stop is not None and self._should_stop() else 0
+
+    def synthesize(self, text: str, on_pcm: Callable[[bytes], None],
+                   should_stop: Optional[Callable[[], bool]] = None):
+        """
+        合成文本（阻塞调用），PCM数据块在合成过程中依次交给 on_pcm
+        Args:
+            text: 要合成的文本
+            on_pcm: 接收PCM数据块的回调，在合成线程中调用
+            should_stop: 返回True时中止合成
+        """
+        data = text.encode("utf-8") + b"\0"
+        with self._lock:
+            self._sink = on_pcm
+            self._should_stop = should_stop
+            try:
+                result = self._lib.espeak_Synth(data, len(data), 0, _POS_CHARACTER, 0,
+                                                _CHARS_UTF8 | _ENDPAUSE, None, None)
+            finally:
+                self._sink = None
+                self._should_stop = None
+
+            if result != _EE_OK:
+                raise EspeakError(f"espeak_Synth 调用失败: {result}")
+            if should_stop is not None and should_stop():
+                self._aborted += 1
+            else:
+                self._completed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "backend": BACKEND_ESPEAK,
+            "sample_rate": self.format.framerate,
+            "completed": self._completed,
+            "aborted": self._aborted
+        }
+
+    def close(self):
+        with self._lock:
+            self._lib.espeak_Terminate()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import subprocess
+from typing import Any, Callable, Dict, List, Set
+from config.settings import settings
+from core.espeak_backend import BACKEND_ESPEAK_PROCESS
+from core.wav import WavFormat, WavFormatError, find_wav_data
+from core.worker_pool import WorkerError, WorkerTimeout, job_timeout
+
+_READ_SIZE = 4096
+_STDERR_TAIL = 4096  # 保留的错误输出长度（字节）
+
+
+class EspeakProcessPool:
+    """
+    预启动的 espeak-ng 子进程池
+    每个子进程以 --stdout 方式运行，文本从 stdin 写入，音频边合成边从 stdout 读出，
+    引擎崩溃只影响对应的子进程。espeak-ng 的输出流中没有句子边界标记，
+    因此每个子进程只合成一次；服务启动时通过 start() 预启动进程，取走后立即在后台补充。
+    """
+
+    def __init__(self, size=settings.WORKER_COUNT, rate=settings.RATE, volume=settings.VOLUME,
+                 voice_index=settings.VOICE_INDEX, executable=settings.ESPEAK_EXECUTABLE):
+        self.size = max(1, size)
+        self.executable = executable
+        self.logger = logging.getLogger(__name__)
+        self.format = WavFormat()  # 以实际输出的WAV头为准
+        self.voices = self._list_voices()
+        self.logger.info(f"可用语音数量: {len(self.voices)}")
+
+        # 音量：pyttsx3 的范围是 0~1，espeak-ng 的 -a 以 100 为正常音量
+        self._args = [executable, "--stdout", "-b", "1", "-s", str(int(rate)), "-a", str(int(volume * 100))]
+        if len(self.voices) > voice_index:
+            self._args += ["-v", self.voices[voice_index]["file"]]
+
+        self._spares: List[asyncio.subprocess.Process] = []
+        self._spawning = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self.logger.info(f"✓ espeak-ng 进程池初始化完成，并发数: {self.size}")
+
+    def _list_voices(self) -> List[Dict[str, Any]]:
+        """通过 espeak-ng --voices 获取语音列表，同时确认可执行文件可用"""
+        try:
+            output = subprocess.run([self.executable, "--voices"], capture_output=True, check=True,
+                                    timeout=settings.WORKER_START_TIMEOUT).stdout.decode("utf-8", "replace")
+        except (OSError, subprocess.SubprocessError) as e:
+            raise WorkerError(f"无法运行 {self.executable}: {e}")
+
+        voices = []
+        # 列：Pty Language Age/Gender VoiceName File Other Languages
+        for line in output.splitlines()[1:]:
+            columns = line.split()
+            if len(columns) >= 5:
+                voices.append({"id": len(voices), "name": columns[3], "file": columns[4]})
+        return voices
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            *self._args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+    async def start(self):
+        """预启动与并发数相同的子进程，服务开始接受请求前调用"""
+        self._refill()
+        await asyncio.gather(*self._tasks)
+        self.logger.info(f"✓ 已预启动 {len(self._spares)} 个 espeak-ng 进程")
+
+    async def _spawn_spare(self):
+        self._spawning += 1
+        try:
+            self._spares.append(await self._spawn())
+        except Exception as e:
+            self.logger.warning(f"⚠️ 预启动 espeak-ng 进程失败: {e}")
+        finally:
+            self._spawning -= 1
+
+    def _refill(self):
+        """在后台补充预启动的进程，数量与并发数一致"""
+        for _ in range(self.size - len(self._spares) - self._spawning):
+            task = asyncio.ensure_future(self._spawn_spare())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _take(self) -> asyncio.subprocess.Process:
+        """取出一个预启动的进程并立即开始补充；没有可用的预启动进程时才在请求中启动"""
+        process = None
+        while self._spares and process is None:
+            process = self._spares.pop()
+            if process.returncode is not None:
+                process = None
+        self._refill()
+        if process is None:
+            self.logger.warning("⚠️ 没有预启动的 espeak-ng 进程，临时启动")
+            process = await self._spawn()
+        return process
+
+    @staticmethod
+    async def _read_stderr(process: asyncio.subprocess.Process) -> bytes:
+        """合成期间持续读取错误输出，避免管道写满阻塞子进程，只保留末尾部分"""
+        tail = b""
+        while data := await process.stderr.read(_READ_SIZE):
+            tail = (tail + data)[-_STDERR_TAIL:]
+        return tail
+
+    async def synthesize(self, text: str, on_pcm: Callable[[bytes], None]):
+        """
+        合成文本，PCM数据块边读边交给 on_pcm；on_pcm 调用前 format 已按WAV头更新
+        Raises:
+            WorkerTimeout: 合成超时，子进程已被终止
+            WorkerError: 子进程异常退出
+        """
+        process = await self._take()
+        stderr = asyncio.ensure_future(self._read_stderr(process))
+        timeout = job_timeout(len(text))
+        try:
+            async with asyncio.timeout(timeout):
+                process.stdin.write(text.encode("utf-8"))
+                await process.stdin.drain()
+                process.stdin.close()
+                await self._read_audio(process, on_pcm)
+                returncode = await process.wait()
+                error = await stderr
+        except TimeoutError:
+            process.kill()
+            self._failed += 1
+            self.logger.error(f"❌ espeak-ng 合成超时({timeout:.1f}秒)，已终止子进程")
+            raise WorkerTimeout(f"合成超时({timeout:.1f}秒)")
+        except asyncio.CancelledError:
+            process.kill()
+            self._cancelled += 1
+            raise
+        except (OSError, WavFormatError) as e:
+            process.kill()
+            self._failed += 1
+            raise WorkerError(f"espeak-ng 子进程异常: {e}")
+        finally:
+            if not stderr.done():
+                stderr.cancel()
+
+        if returncode != 0:
+            self._failed += 1
+            message = error.decode("utf-8", "replace").strip()
+            raise WorkerError(f"espeak-ng 异常退出({returncode}): {message[-200:]}")
+        self._completed += 1
+
+    async def _read_audio(self, process: asyncio.subprocess.Process, on_pcm: Callable[[bytes], None]):
+        """读取 stdout 上的WAV流：解析出文件头后按完整采样帧交付PCM，长度字段不可靠，忽略"""
+        buffer = b""
+        header_parsed = False
+        while True:
+            data = await process.stdout.read(_READ_SIZE)
+            if not data:
+                break
+            buffer += data
+            if not header_parsed:
+                located = find_wav_data(buffer)
+                if located is None:
+                    continue
+                self.format, offset, _ = located
+                buffer = buffer[offset:]
+                header_parsed = True
+
+            usable = len(buffer) - len(buffer) % self.format.frame_size
+            if usable:
+                on_pcm(buffer[:usable])
+                buffer = buffer[usable:]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "backend": BACKEND_ESPEAK_PROCESS,
+            "spares": len(self._spares),
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled
+        }
+
+    def close(self):
+        for process in self._spares:
+            if process.returncode is None:
+                process.kill()
+        self._spares.clear()
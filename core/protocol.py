@@ -0,0 +1,33 @@
+import struct
+from typing import Tuple
+
+# 二进制音频帧头：stream_id(uint32) + chunk_index(uint32) + flags(uint8)，网络字节序
+# stream_id 在 synthesis_start 消息中下发，用于把二进制帧关联到 request_id
+AUDIO_FRAME_HEADER = struct.Struct('!IIB')
+
+# flags 位定义
+FLAG_WAV_HEADER = 0x01  # 该块以WAV文件头开始
+
+AUDIO_TRANSPORT_JSON = "json"
+AUDIO_TRANSPORT_BINARY = "binary"
+AUDIO_TRANSPORTS = (AUDIO_TRANSPORT_JSON, AUDIO_TRANSPORT_BINARY)
+
+
+def pack_audio_frame(stream_id: int, chunk_index: int, audio, flags: int = 0) -> bytes:
+    """把音频块打包为带固定头的二进制帧"""
+    return AUDIO_FRAME_HEADER.pack(stream_id, chunk_index, flags) + audio
+
+
+def unpack_audio_frame(frame: bytes) -> Tuple[int, int, int, memoryview]:
+    """解析二进制帧，返回 (stream_id, chunk_index, flags, 音频数据)"""
+    stream_id, chunk_index, flags = AUDIO_FRAME_HEADER.unpack_from(frame)
+    return stream_id, chunk_index, flags, memoryview(frame)[AUDIO_FRAME_HEADER.size:]
+
+
+def describe_binary_transport() -> dict:
+    """欢迎消息中对二进制帧格式的说明"""
+    return {
+        "header": "stream_id:uint32, chunk_index:uint32, flags:uint8 (big-endian)",
+        "header_size": AUDIO_FRAME_HEADER.size,
+        "flags": {"wav_header": FLAG_WAV_HEADER}
+    }
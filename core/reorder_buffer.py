@@ -0,0 +1,33 @@
+from typing import Any, Dict, List
+
+
+class ReorderBuffer:
+    """
+    重排缓冲区
+    并行任务的结果可能乱序到达，按序号缓存后只按顺序放行。
+    """
+
+    def __init__(self, start: int = 0):
+        self.next_index = start
+        self._pending: Dict[int, Any] = {}
+
+    def put(self, index: int, item: Any) -> List[Any]:
+        """
+        放入一个结果，返回此时可以按序输出的全部结果
+        Args:
+            index: 结果序号
+            item: 结果数据
+        """
+        if index < self.next_index or index in self._pending:
+            raise ValueError(f"重复的序号: {index}")
+
+        self._pending[index] = item
+        ready = []
+        while self.next_index in self._pending:
+            ready.append(self._pending.pop(self.next_index))
+            self.next_index += 1
+        return ready
+
+    def __len__(self) -> int:
+        """尚未放行的结果数量"""
+        return len(self._pending)
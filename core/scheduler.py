@@ -0,0 +1,395 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+from config.settings import settings
+from core.cost_model import CostModel
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+# 数值越小越优先
+PRIORITY_CLASSES = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 1}
+
+
+class SynthesisRejected(Exception):
+    """请求未被执行或未能完成；code 和 details 会原样返回给客户端"""
+    code = "rejected"
+
+    def __init__(self, message: str, **details):
+        super().__init__(message)
+        self.details = details
+
+
+class OverloadedError(SynthesisRejected):
+    """排队过深或预计等待过久，拒绝新的合成"""
+    code = "overloaded"
+
+
+class DeadlineExceeded(SynthesisRejected):
+    """请求已超过客户端给定的截止时间"""
+    code = "deadline_exceeded"
+
+
+class SynthesisFailed(SynthesisRejected):
+    """合成引擎超时或崩溃，请求无法完成"""
+    code = "synthesis_failed"
+
+
+@dataclass
+class SynthesisJob:
+    """一次合成请求的调度属性，请求的所有片段共享同一个实例"""
+    request_id: str = ""
+    priority: str = PRIORITY_INTERACTIVE
+    deadline: Optional[float] = None  # 事件循环时间，超过后丢弃
+    started: bool = False  # 是否已有片段开始合成
+    voice: Hashable = None  # 耗时模型使用的语音键
+    remaining_chars: int = 0  # 尚未合成完成的字符数
+    tenant: str = ""  # 公平调度的租户键（API key 或连接ID）
+
+    @property
+    def priority_rank(self) -> int:
+        return PRIORITY_CLASSES[self.priority]
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数，无截止时间时为None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - asyncio.get_event_loop().time()
+
+    def promote(self, other: "SynthesisJob"):
+        """
+        合并请求时调整共享合成的调度属性：
+        采用更高的优先级，避免交互请求等待共享的预取合成；
+        截止时间取最宽松的一个，避免某个订阅者过期导致其他订阅者失败。
+        """
+        if other.priority_rank < self.priority_rank:
+            self.priority = other.priority
+        if self.deadline is not None:
+            self.deadline = None if other.deadline is None else max(self.deadline, other.deadline)
+
+
+class AdmissionTicket:
+    """已准入请求的占位，合成结束后必须释放"""
+
+    def __init__(self, scheduler: "SynthesisScheduler", cost: float, tenant: str):
+        self._scheduler = scheduler
+        self.cost = cost
+        self.tenant = tenant
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._finish(self)
+
+
+@dataclass
+class _Waiter:
+    job: SynthesisJob
+    future: asyncio.Future
+    enqueued_at: float
+    seq: int
+    chars: int = 0  # 本次占用空位要合成的字符数
+    expiry: Optional[asyncio.TimerHandle] = None
+
+
+class SynthesisScheduler:
+    """
+    合成任务调度器
+    控制同时执行的合成任务数不超过合成能力；有空位时按优先级放行等待中的任务，
+    等待时间会逐渐提升任务的有效优先级，防止后台任务被无限饿死。
+    同一优先级内按请求剩余的估算耗时优先放行短任务，降低混合负载下的中位延迟。
+    不同租户之间按加权的差额轮转（DRR）分配合成时间，单个租户的大量请求只会拉长它自己的排队时间。
+    新请求需先经过准入控制：未完成请求过多或预计等待过久时直接拒绝。
+    """
+
+    def __init__(self, capacity: int, cost_model: CostModel, aging=settings.SCHEDULER_AGING_SECONDS,
+                 max_queue_depth=settings.MAX_QUEUE_DEPTH, max_estimated_wait=settings.MAX_ESTIMATED_WAIT):
+        self.capacity = max(1, capacity)
+        self.cost_model = cost_model
+        self.aging = aging
+        self.sjf_reference = settings.SJF_REFERENCE_SECONDS
+        self.max_queue_depth = max_queue_depth
+        self.max_estimated_wait = max_estimated_wait
+        self._outstanding = 0
+        self._outstanding_cost = 0.0
+        self._rejected = 0
+        self._expired = 0
+        self.logger = logging.getLogger(__name__)
+        self._running = 0
+        self._waiting: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._dispatched: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self.quantum = settings.FAIR_QUEUE_QUANTUM_SECONDS
+        self._tenant_outstanding: Dict[str, int] = {}
+        self._tenant_cost: Dict[str, float] = {}
+        # 有排队任务的租户按到达顺序组成轮转环，_drr_index 指向当前被服务的租户
+        self._tenants: List[str] = []
+        self._tenant_waiting: Dict[str, int] = {}
+        self._deficits: Dict[str, float] = {}
+        self._drr_index = 0
+
+    def estimate_cost(self, job: SynthesisJob, chars: int) -> float:
+        """按请求语音的耗时模型估算合成指定字符数所需的时间（秒）"""
+        return self.cost_model.estimate(job.voice, chars)
+
+    def estimated_wait(self) -> float:
+        """按未完成请求的估算耗时计算新请求的预计等待时间（秒）"""
+        return self._outstanding_cost / self.capacity
+
+    @staticmethod
+    def tenant_weight(tenant: str) -> float:
+        return max(0.01, settings.TENANT_WEIGHTS.get(tenant, settings.DEFAULT_TENANT_WEIGHT))
+
+    def tenant_wait(self, tenant: str) -> float:
+        """
+        公平调度下某个租户新请求的预计等待时间（秒）
+        按租户自己未完成的请求和按权重分得的合成能力计算；其他租户在排队时，
+        积压较多的租户会比全局预计等待更早达到上限。
+        """
+        own_cost = self._tenant_cost.get(tenant, 0.0)
+        if own_cost <= 0:
+            return 0.0
+        total_weight = sum(self.tenant_weight(t) for t in self._tenant_outstanding)
+        if tenant not in self._tenant_outstanding:
+            total_weight += self.tenant_weight(tenant)
+        share = self.tenant_weight(tenant) / total_weight
+        return own_cost / (self.capacity * share)
+
+    def admit(self, job: SynthesisJob, chars: int) -> AdmissionTicket:
+        """
+        准入检查，通过时返回占位票据
+        全局预计等待是硬上限，租户的公平份额等待只会让积压过多的租户更早被拒绝。
+        后台请求只允许使用一半的等待预算，过载时先于交互请求被拒绝。
+        Raises:
+            DeadlineExceeded: 预计等待时间已超过请求的截止时间
+            OverloadedError: 排队深度或预计等待超过上限
+        """
+        cost = self.estimate_cost(job, chars)
+        wait = max(self.estimated_wait(), self.tenant_wait(job.tenant))
+        remaining = job.remaining()
+        if remaining is not None and remaining <= wait:
+            self.logger.info(f"请求 {job.request_id} 在截止时间前无法开始合成，直接丢弃")
+            raise DeadlineExceeded("请求在截止时间前无法完成，已丢弃", stage="admission")
+
+        max_wait = self.max_estimated_wait
+        if job.priority != PRIORITY_INTERACTIVE:
+            max_wait /= 2
+
+        if self._outstanding >= self.max_queue_depth:
+            # 大约需要等一个请求完成
+            retry_after = self._outstanding_cost / max(1, self._outstanding) / self.capacity
+            reason = f"排队请求数已达上限({self.max_queue_depth})"
+        elif wait + cost / self.capacity > max_wait and self._outstanding > 0:
+            retry_after = wait + cost / self.capacity - max_wait
+            reason = f"预计等待时间过长({wait:.1f}秒)"
+        else:
+            self._outstanding += 1
+            self._outstanding_cost += cost
+            self._tenant_outstanding[job.tenant] = self._tenant_outstanding.get(job.tenant, 0) + 1
+            self._tenant_cost[job.tenant] = self._tenant_cost.get(job.tenant, 0.0) + cost
+            return AdmissionTicket(self, cost, job.tenant)
+
+        self._rejected += 1
+        retry_after_ms = int(max(1.0, retry_after) * 1000)
+        self.logger.warning(f"⚠️ 服务过载，拒绝请求 {job.request_id}: {reason}")
+        raise OverloadedError(f"服务繁忙: {reason}", retry_after_ms=retry_after_ms,
+                              queue_depth=self._outstanding, estimated_wait_ms=int(wait * 1000))
+
+    def _finish(self, ticket: AdmissionTicket):
+        self._outstanding -= 1
+        self._outstanding_cost = max(0.0, self._outstanding_cost - ticket.cost)
+        count = self._tenant_outstanding[ticket.tenant] - 1
+        if count > 0:
+            self._tenant_outstanding[ticket.tenant] = count
+            self._tenant_cost[ticket.tenant] = max(0.0, self._tenant_cost[ticket.tenant] - ticket.cost)
+        else:
+            del self._tenant_outstanding[ticket.tenant]
+            del self._tenant_cost[ticket.tenant]
+
+    def _effective_rank(self, waiter: _Waiter, now: float) -> float:
+        """
+        有效优先级：优先级类别 + 短任务项 - 按等待时间折算的提升量
+        短任务项由请求剩余的估算耗时映射到 [0, 1)，只在同一优先级内起作用。
+        """
+        cost = self.estimate_cost(waiter.job, waiter.job.remaining_chars)
+        shortness = cost / (cost + self.sjf_reference) if self.sjf_reference > 0 else 0.0
+        boost = (now - waiter.enqueued_at) / self.aging if self.aging > 0 else 0.0
+        return waiter.job.priority_rank + shortness - boost
+
+    def _select(self) -> _Waiter:
+        """
+        选出下一个放行的任务
+        先取有效优先级最高的等级（取整后的有效优先级），该等级内各租户以自己最靠前的任务参与轮转。
+        """
+        now = time.monotonic()
+        ranked = [((self._effective_rank(w, now), w.seq), w) for w in self._waiting]
+        band = math.floor(min(key for key, _ in ranked)[0])
+        heads: Dict[str, Tuple[Tuple[float, int], _Waiter]] = {}
+        for key, waiter in ranked:
+            if key[0] < band + 1:
+                tenant = waiter.job.tenant
+                if tenant not in heads or key < heads[tenant][0]:
+                    heads[tenant] = (key, waiter)
+
+        if len(heads) == 1:
+            return next(iter(heads.values()))[1]
+        return heads[self._next_tenant({t: w for t, (_, w) in heads.items()})][1]
+
+    def _next_tenant(self, heads: Dict[str, _Waiter]) -> str:
+        """
+        差额轮转：当前租户的额度足够支付其队首任务的估算耗时就继续服务它，
+        否则给它发放下一轮额度（按权重）并轮到环上的下一个租户。
+        额度配置为0时每轮发放当前最大的队首耗时，退化为按权重的轮流放行。
+        """
+        costs = {tenant: self.estimate_cost(w.job, w.chars) for tenant, w in heads.items()}
+        quantum = self.quantum if self.quantum > 0 else max(costs.values())
+        pos = self._drr_index % len(self._tenants)
+        while True:
+            tenant = self._tenants[pos]
+            if tenant in heads:
+                if self._deficits[tenant] >= costs[tenant]:
+                    self._deficits[tenant] -= costs[tenant]
+                    self._drr_index = pos
+                    return tenant
+                self._deficits[tenant] += quantum * self.tenant_weight(tenant)
+            pos = (pos + 1) % len(self._tenants)
+
+    def _enqueue(self, waiter: _Waiter):
+        self._waiting.append(waiter)
+        tenant = waiter.job.tenant
+        if tenant not in self._tenant_waiting:
+            self._tenant_waiting[tenant] = 0
+            self._deficits[tenant] = 0.0
+            self._tenants.append(tenant)
+        self._tenant_waiting[tenant] += 1
+
+    def _dequeue(self, waiter: _Waiter):
+        """把任务移出等待队列；租户没有排队任务时退出轮转环并清空额度"""
+        self._waiting.remove(waiter)
+        tenant = waiter.job.tenant
+        self._tenant_waiting[tenant] -= 1
+        if self._tenant_waiting[tenant] == 0:
+            del self._tenant_waiting[tenant]
+            del self._deficits[tenant]
+            index = self._tenants.index(tenant)
+            self._tenants.pop(index)
+            if index < self._drr_index:
+                self._drr_index -= 1
+
+    def _dispatch(self):
+        """在有空位时放行等待中的任务"""
+        while self._running < self.capacity and self._waiting:
+            waiter = self._select()
+            self._dequeue(waiter)
+            if waiter.future.done():
+                continue
+            self._running += 1
+            self._dispatched[waiter.job.priority] += 1
+            waiter.job.started = True
+            waiter.future.set_result(None)
+
+    def _schedule_expiry(self, waiter: _Waiter):
+        if waiter.job.deadline is not None:
+            loop = asyncio.get_running_loop()
+            waiter.expiry = loop.call_at(waiter.job.deadline, self._expire, waiter)
+
+    def _expire(self, waiter: _Waiter):
+        """排队中的任务到达截止时间，不再合成"""
+        remaining = waiter.job.remaining()
+        if remaining is None:
+            return
+        if remaining > 0:
+            # 合并请求后截止时间被放宽
+            self._schedule_expiry(waiter)
+            return
+
+        if waiter in self._waiting and not waiter.future.done():
+            self._dequeue(waiter)
+            self._expired += 1
+            self.logger.info(f"请求 {waiter.job.request_id} 排队超过截止时间，已丢弃")
+            waiter.future.set_exception(DeadlineExceeded("请求排队超过截止时间，已丢弃", stage="queued"))
+
+    async def acquire(self, job: SynthesisJob, chars: int = 0):
+        """
+        等待一个合成空位
+        Args:
+            job: 请求的调度属性
+            chars: 本次要合成的字符数，用于租户间的轮转计费
+        Raises:
+            DeadlineExceeded: 排队期间超过请求的截止时间
+        """
+        remaining = job.remaining()
+        if remaining is not None and remaining <= 0:
+            self._expired += 1
+            raise DeadlineExceeded("请求排队超过截止时间，已丢弃", stage="queued")
+
+        if self._running < self.capacity and not self._waiting:
+            self._running += 1
+            self._dispatched[job.priority] += 1
+            job.started = True
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(job, loop.create_future(), time.monotonic(), next(self._seq), chars)
+        self._enqueue(waiter)
+        self._schedule_expiry(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiting:
+                self._dequeue(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # 已分配到空位但任务被取消，归还空位
+                self.release()
+            raise
+        finally:
+            if waiter.expiry is not None:
+                waiter.expiry.cancel()
+
+    def has_free_slot(self) -> bool:
+        """是否有空闲空位且没有排队任务"""
+        return self._running < self.capacity and not self._waiting
+
+    def try_acquire(self) -> bool:
+        """有空闲空位且没有排队任务时立即占用一个空位（用于对冲派发），否则返回False"""
+        if self.has_free_slot():
+            self._running += 1
+            return True
+        return False
+
+    def release(self):
+        """归还合成空位"""
+        self._running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, job: SynthesisJob, chars: int = 0):
+        """以上下文管理器方式占用一个合成空位"""
+        await self.acquire(job, chars)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度器状态"""
+        waiting: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        for waiter in self._waiting:
+            waiting[waiter.job.priority] += 1
+        return {
+            "capacity": self.capacity,
+            "running": self._running,
+            "waiting": waiting,
+            "dispatched": dict(self._dispatched),
+            "outstanding_requests": self._outstanding,
+            "active_tenants": len(self._tenant_outstanding),
+            "waiting_tenants": len(self._tenants),
+            "estimated_wait": round(self.estimated_wait(), 3),
+            "rejected": self._rejected,
+            "expired": self._expired
+        }
@@ -0,0 +1,89 @@
+import re
+from typing import List
+from config.settings import settings
+
+# 句末标点（中英文），英文句号需后接空白或结尾，避免切开小数和缩写中的点
+_SENTENCE_PATTERN = re.compile(r'.*?(?:[。！？；…!?;\n]+|\.(?=\s|$))+[”’"\')）]*', re.S)
+# 句内停顿标点，用于切分过长的句子
+_CLAUSE_PATTERN = re.compile(r'.*?[，,、：:—]+', re.S)
+# 窗口内最后一处空白，用于在没有标点时按词切开
+_LAST_SPACE_PATTERN = re.compile(r'.*\s', re.S)
+
+
+def _split_by(pattern, text: str) -> List[str]:
+    """按正则切分文本，保留标点，剩余部分作为最后一段"""
+    parts = []
+    pos = 0
+    for match in pattern.finditer(text):
+        if match.end() == pos:
+            continue
+        parts.append(text[pos:match.end()])
+        pos = match.end()
+    if pos < len(text):
+        parts.append(text[pos:])
+    return parts
+
+
+def _hard_split(clause: str, max_chars: int) -> List[str]:
+    """按长度切开没有分句标点的超长文本，优先在空白处切开以免拆散单词；没有空白时（如中文）按字符切"""
+    pieces = []
+    while len(clause) > max_chars:
+        match = _LAST_SPACE_PATTERN.match(clause, 0, max_chars)
+        cut = match.end() if match and match.group().strip() else max_chars
+        pieces.append(clause[:cut])
+        clause = clause[cut:]
+    pieces.append(clause)
+    return pieces
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """把超长句子在分句标点处切开，仍然过长时在空白处或按长度切开"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    pieces = []
+    current = ""
+    for clause in _split_by(_CLAUSE_PATTERN, sentence):
+        if current and len(current) + len(clause) > max_chars:
+            pieces.append(current)
+            current = ""
+        *full, clause = _hard_split(clause, max_chars)
+        pieces.extend(full)
+        current += clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text(text: str, max_chars=settings.SEGMENT_MAX_CHARS,
+               first_max_chars=settings.FIRST_SEGMENT_MAX_CHARS) -> List[str]:
+    """
+    把文本切分为适合逐段合成的片段
+    首段尽量短以降低首包延迟，后续片段在不超过 max_chars 的前提下合并相邻句子。
+    Args:
+        text: 要切分的文本
+        max_chars: 普通片段的最大字符数
+        first_max_chars: 首个片段的最大字符数
+    Returns:
+        非空片段列表（已去除首尾空白）
+    """
+    sentences = [s for s in _split_by(_SENTENCE_PATTERN, text) if s.strip()]
+    if not sentences:
+        return []
+
+    pieces = _split_long(sentences[0], first_max_chars)
+    for sentence in sentences[1:]:
+        pieces.extend(_split_long(sentence, max_chars))
+
+    # 首段只放一句（或一个分句），尽快产出第一段音频；之后合并相邻短句减少合成次数
+    segments = [pieces[0]]
+    current = ""
+    for piece in pieces[1:]:
+        if current and len(current) + len(piece) > max_chars:
+            segments.append(current)
+            current = ""
+        current += piece
+    if current:
+        segments.append(current)
+
+    return [s.strip() for s in segments if s.strip()]
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+
+class _Flight:
+    """一次进行中的合成：生产者持续追加音频块，订阅者从头开始跟随读取"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.job = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.finished = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def follow(self) -> AsyncGenerator[Any, None]:
+        """从第一个块开始输出，直到生产者结束"""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.finished)
+                pending = self.chunks[index:]
+                finished = self.finished
+
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+
+            if finished and index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    相同请求的并发合并
+    同一键同时只有一个生产者执行合成，并发到达的相同请求订阅同一输出流；
+    所有订阅者都离开后生产者被取消。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def _produce(self, key: Hashable, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]):
+        error = None
+        try:
+            async with aclosing(factory()) as stream:
+                async for chunk in stream:
+                    await flight.publish(chunk)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+        except Exception as e:
+            error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            await flight.finish(error)
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]],
+                     job=None) -> AsyncGenerator[Any, None]:
+        """
+        获取键对应的输出流，没有进行中的生产者时调用 factory 启动一个
+        生产者被取消（而不是订阅者自己被取消）时不把取消传给订阅者：尚未输出时重新发起合成，已输出部分时报错。
+        Args:
+            key: 请求去重键
+            factory: 返回音频块异步迭代器的工厂函数
+            job: 请求的调度属性；合并到已有生产者时用于提升其优先级
+        """
+        yielded = False
+        while True:
+            flight = self._join(key, factory, job)
+            flight.subscribers += 1
+            try:
+                async for chunk in flight.follow():
+                    yielded = True
+                    yield chunk
+                return
+            except asyncio.CancelledError as e:
+                if e is not flight.error:
+                    raise
+                if yielded:
+                    raise RuntimeError("共享的合成已被中止")
+                self.logger.info("共享的合成已被中止，重新发起合成")
+            finally:
+                flight.subscribers -= 1
+                if flight.subscribers == 0 and not flight.finished:
+                    # 立即移出，之后到达的相同请求启动新的生产者，而不是加入正在取消的这一个
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+                    flight.task.cancel()
+
+    def _join(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]], job) -> _Flight:
+        """加入键对应的进行中生产者，没有时启动一个"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.job = job
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._produce(key, flight, factory))
+            self.started += 1
+        else:
+            if job is not None and flight.job is not None:
+                flight.job.promote(job)
+            self.coalesced += 1
+            self.logger.info(f"🔗 合并相同的进行中合成请求，当前订阅数: {flight.subscribers + 1}")
+        return flight
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
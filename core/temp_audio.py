@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from config.settings import settings
+
+TEMP_AUDIO_SUBDIR = "tts-service"
+
+logger = logging.getLogger(__name__)
+
+
+def _usable_dir(directory: str) -> bool:
+    return bool(directory) and os.path.isdir(directory) and os.access(directory, os.W_OK | os.X_OK)
+
+
+def resolve_temp_dir(tmpfs_dir=settings.TEMP_AUDIO_TMPFS_DIR,
+                     fallback_dir=settings.TEMP_AUDIO_FALLBACK_DIR) -> str:
+    """
+    确定引擎输出临时音频的目录
+    优先使用内存文件系统（如 /dev/shm），不写容器的 overlay 磁盘；不可用时退回配置的目录或系统临时目录。
+    """
+    base = tmpfs_dir if _usable_dir(tmpfs_dir) else (fallback_dir or tempfile.gettempdir())
+    directory = os.path.join(base, TEMP_AUDIO_SUBDIR)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def new_temp_audio_file(directory: str) -> str:
+    """在临时音频目录中创建一个空的 .wav 文件并返回路径，文件名带进程号便于排查"""
+    fd, path = tempfile.mkstemp(suffix=".wav", prefix=f"{os.getpid()}-", dir=directory)
+    os.close(fd)
+    return path
+
+
+class TempFileSweeper:
+    """
+    孤儿临时文件清理线程
+    合成进程崩溃或被终止时留下的临时音频不会被正常清理，按修改时间定期删除超过 max_age 的文件。
+    多个服务进程共享同一目录时也只会删除早已过期的文件。
+    """
+
+    def __init__(self, directory: str, max_age=settings.TEMP_AUDIO_MAX_AGE,
+                 interval=settings.TEMP_AUDIO_SWEEP_INTERVAL):
+        self.directory = directory
+        self.max_age = max_age
+        self.interval = interval
+        self.removed = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="temp-audio-sweeper", daemon=True)
+
+    def sweep(self) -> int:
+        """删除过期的临时文件，返回删除数量"""
+        deadline = time.time() - self.max_age
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError as e:
+            logger.warning(f"扫描临时音频目录失败: {e}")
+            return 0
+
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < deadline:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                # 文件已被其他进程删除或仍在使用（Windows）
+                continue
+
+        if removed:
+            self.removed += removed
+            logger.info(f"已清理 {removed} 个遗留的临时音频文件")
+        return removed
+
+    def _run(self):
+        while True:
+            self.sweep()
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,15 +1,31 @@
-import pyttsx3
 import warnings
-import threading
-import tempfile
 import os
+import time
 from io import BytesIO
 import base64
 import json
 import asyncio
+import itertools
 import logging
-from typing import AsyncGenerator, Dict, Any
+from contextlib import aclosing
+from typing import AsyncGenerator, Callable, Dict, Any, List, Optional, Tuple
 from config.settings import settings
+from core.engine_pool import EnginePool
+from core.worker_pool import SynthesisWorkerPool, WorkerError, WorkerTimeout, job_timeout
+from core.segmenter import split_text
+from core.wav import WavFormat, WavTail, build_wav_header, finalize_wav, parse_wav
+from core.reorder_buffer import ReorderBuffer
+from core.cache import AudioCache, make_cache_key
+from core.disk_cache import DiskAudioCache
+from core.singleflight import SingleFlight
+from core.cost_model import CostModel
+from core.batcher import BatchItem, MicroBatcher
+from core.espeak_backend import BACKEND_ESPEAK, BACKEND_ESPEAK_PROCESS, EspeakEngine
+from core.espeak_process import EspeakProcessPool
+from core.temp_audio import TempFileSweeper, new_temp_audio_file, resolve_temp_dir
+from core.scheduler import (PRIORITY_INTERACTIVE, DeadlineExceeded, SynthesisFailed, SynthesisJob, SynthesisRejected,
+                            SynthesisScheduler)
+from core.protocol import AUDIO_TRANSPORT_BINARY, AUDIO_TRANSPORT_JSON, FLAG_WAV_HEADER, pack_audio_frame
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
@@ -19,144 +35,619 @@ class SpeechSynthesizer:
         self.rate = rate
         self.volume = volume
         self.voice_index = voice_index
-        self.lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        self.audio_cache = AudioCache()
+        self.disk_cache = DiskAudioCache() if settings.DISK_CACHE_MAX_BYTES > 0 else None
+        self.single_flight = SingleFlight()
+        self._stream_ids = itertools.count(1)
+        self.temp_dir = resolve_temp_dir()
+        self.temp_sweeper = TempFileSweeper(self.temp_dir)
+        self.temp_sweeper.start()
+        self.logger.info(f"临时音频目录: {self.temp_dir}")
+        self._hedges = {"launched": 0, "won": 0}
+        # 直接取得PCM的后端没有临时文件和引擎运行循环的开销，不需要微批处理
+        self.direct_pcm = settings.TTS_BACKEND in (BACKEND_ESPEAK, BACKEND_ESPEAK_PROCESS)
+        self.batcher = MicroBatcher(self._render_batch) if settings.BATCH_WINDOW > 0 and not self.direct_pcm else None
         self._init_engine()
+        self.voice_id = self._resolve_voice_id()
+        self.cost_model = CostModel()
+        self.scheduler = SynthesisScheduler(self._synthesis_capacity(), self.cost_model)
+
+    def _resolve_voice_id(self) -> str:
+        """当前语音的标识（espeak-ng 子进程池为语音文件名，其余为语音名称），找不到时为引擎默认语音"""
+        voices = self._engine_backend().voices
+        if len(voices) > self.voice_index:
+            voice = voices[self.voice_index]
+            return voice.get("file", voice["name"])
+        return "default"
 
     def _init_engine(self):
-        """初始化语音合成引擎"""
+        """初始化语音合成引擎：espeak-ng 子进程池、多进程工作池，或进程内引擎池 / libespeak-ng 引擎"""
+        self.engine_pool = None
+        self.worker_pool = None
+        self.espeak_engine = None
+        self.espeak_processes = None
         try:
-            self.engine = pyttsx3.init()
-            self.engine.setProperty('rate', self.rate)
-            self.engine.setProperty('volume', self.volume)
-
-            # 设置语音
-            voices = self.engine.getProperty('voices')
-            if voices and len(voices) > self.voice_index:
-                self.engine.setProperty('voice', voices[self.voice_index].id)
-
+            if settings.TTS_BACKEND == BACKEND_ESPEAK_PROCESS:
+                # 每个合成任务都在独立的 espeak-ng 子进程中执行，不需要再经过工作进程
+                self.espeak_processes = EspeakProcessPool(
+                    size=settings.WORKER_COUNT,
+                    rate=self.rate,
+                    volume=self.volume,
+                    voice_index=self.voice_index
+                )
+            elif settings.WORKER_COUNT > 0:
+                self.worker_pool = SynthesisWorkerPool(
+                    size=settings.WORKER_COUNT,
+                    rate=self.rate,
+                    volume=self.volume,
+                    voice_index=self.voice_index,
+                    temp_dir=self.temp_dir,
+                    backend=settings.TTS_BACKEND
+                )
+            elif self.direct_pcm:
+                self.espeak_engine = EspeakEngine(rate=self.rate, volume=self.volume, voice_index=self.voice_index)
+            else:
+                self.engine_pool = EnginePool(
+                    size=settings.ENGINE_POOL_SIZE,
+                    rate=self.rate,
+                    volume=self.volume,
+                    voice_index=self.voice_index
+                )
             self.logger.info("✓ 语音合成器初始化完成")
-            self.logger.info(f"可用语音数量: {len(voices)}")
-            for i, voice in enumerate(voices):
-                self.logger.info(f"语音 {i}: {voice.name}")
 
         except Exception as e:
             self.logger.error(f"❌ 语音合成器初始化失败: {e}")
             raise
 
-    async def text_to_speech_stream(self, text: str, chunk_size=settings.CHUNK_SIZE) -> AsyncGenerator[bytes, None]:
+    def _synthesize_in_process(self, items: List[Tuple[str, str]], job: Dict[str, Any]):
+        """在当前进程中借出引擎执行阻塞的合成操作，多段文本排入同一次引擎运行"""
+        with self.engine_pool.engine() as engine:
+            job['engine'] = engine
+            if job.get('cancelled'):
+                return
+            for text, filename in items:
+                engine.save_to_file(text, filename)
+            engine.runAndWait()
+
+    async def _render_to_file(self, text: str, filename: str):
+        """把文本合成到音频文件"""
+        await self._render_to_files([(text, filename)])
+
+    async def _render_to_files(self, items: List[Tuple[str, str]]):
+        """把多段文本在一次引擎运行中分别合成到各自的音频文件，优先派发给工作进程"""
+        if self.worker_pool:
+            await self.worker_pool.render_batch(items)
+            return
+
+        job: Dict[str, Any] = {}
+        loop = asyncio.get_event_loop()
+        timeout = job_timeout(sum(len(text) for text, _ in items))
+        try:
+            async with asyncio.timeout(timeout):
+                await loop.run_in_executor(None, self._synthesize_in_process, items, job)
+        except (asyncio.CancelledError, TimeoutError) as e:
+            # 线程无法被强制结束，通知引擎中断当前合成使其尽快归还
+            job['cancelled'] = True
+            engine = job.get('engine')
+            if engine is not None:
+                try:
+                    engine.stop()
+                except Exception:
+                    pass
+            if isinstance(e, TimeoutError):
+                self.logger.error(f"❌ 进程内合成超时({timeout:.1f}秒)，已通知引擎中止")
+                raise WorkerTimeout(f"合成超时({timeout:.1f}秒)")
+            raise
+        except Exception as e:
+            # 引擎异常或等待引擎超时，与工作进程模式一样按引擎故障处理
+            raise WorkerError(f"进程内合成失败: {e}") from e
+
+    def _engine_backend(self):
+        """当前使用的合成引擎（工作池、引擎池、libespeak-ng 引擎或 espeak-ng 子进程池）"""
+        return self.worker_pool or self.engine_pool or self.espeak_engine or self.espeak_processes
+
+    def _engine_stats_key(self) -> str:
+        """get_voice_info 中引擎统计的键名，与当前使用的合成引擎对应"""
+        if self.worker_pool:
+            return "worker_pool"
+        if self.engine_pool:
+            return "engine_pool"
+        if self.espeak_engine:
+            return "espeak_engine"
+        return "espeak_processes"
+
+    def _synthesis_capacity(self) -> int:
+        """可同时执行的合成任务数"""
+        return self._engine_backend().size
+
+    def _pcm_format(self) -> WavFormat:
+        """直接输出PCM的后端的音频格式（子进程池以最近一次输出的WAV头为准）"""
+        return self._engine_backend().format
+
+    async def _render_pcm(self, text: str, on_pcm: Callable[[bytes], None]):
         """
-        异步流式语音合成
-        Args:
-            text: 要合成的文本
-            chunk_size: 流式输出块大小
-        Yields:
-            音频数据块（bytes）
+        由直接输出PCM的后端合成文本，不经过临时文件
+        PCM数据块在事件循环线程中按顺序交给 on_pcm，全部交付后本协程才返回。
         """
-        if not text or len(text.strip()) < 1:
-            yield b""
+        if self.espeak_processes:
+            # 子进程的输出直接在事件循环中读取，超时和取消时终止子进程
+            await self.espeak_processes.synthesize(text, on_pcm)
             return
 
-        temp_file = None
-        temp_filename = None
+        loop = asyncio.get_event_loop()
 
-        try:
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_filename = temp_file.name
+        def deliver(pcm: bytes):
+            loop.call_soon_threadsafe(on_pcm, pcm)
 
-            self.logger.info(f"🎵 开始合成语音，文本长度: {len(text)} 字符")
+        if self.worker_pool:
+            await self.worker_pool.render_pcm(text, deliver)
+            return
 
-            # 在线程中执行阻塞的合成操作
-            def synthesize():
-                with self.lock:
-                    try:
-                        engine = pyttsx3.init()
-                        engine.setProperty('rate', self.rate)
-                        engine.setProperty('volume', self.volume)
+        state = {"cancelled": False}
+        timeout = job_timeout(len(text))
+        try:
+            async with asyncio.timeout(timeout):
+                await loop.run_in_executor(None, self.espeak_engine.synthesize, text, deliver,
+                                           lambda: state["cancelled"])
+        except (asyncio.CancelledError, TimeoutError) as e:
+            # 合成回调检查到该标志后中止本次合成，引擎随即可以继续使用
+            state["cancelled"] = True
+            if isinstance(e, TimeoutError):
+                self.logger.error(f"❌ 进程内合成超时({timeout:.1f}秒)，已中止")
+                raise WorkerTimeout(f"合成超时({timeout:.1f}秒)")
+            raise
+        except Exception as e:
+            raise WorkerError(f"进程内合成失败: {e}") from e
 
-                        voices = engine.getProperty('voices')
-                        if voices and len(voices) > self.voice_index:
-                            engine.setProperty('voice', voices[self.voice_index].id)
+    def _hedge_delay(self, job: SynthesisJob, chars: int) -> Optional[float]:
+        """对冲派发前的等待时间：估算耗时 × 近期耗时偏差的分位数；不适用时返回None"""
+        if not self.worker_pool or self.worker_pool.size < 2 or settings.HEDGE_PERCENTILE <= 0:
+            return None
+        slowdown = self.cost_model.slowdown_quantile(settings.HEDGE_PERCENTILE)
+        if slowdown is None:
+            return None
+        return max(settings.HEDGE_MIN_DELAY, slowdown * self.cost_model.estimate(job.voice, chars))
 
-                        engine.save_to_file(text, temp_filename)
-                        engine.runAndWait()
-                    except Exception as e:
-                        self.logger.error(f"合成过程中出错: {e}")
+    def _new_temp_file(self, temp_files: List[str]) -> str:
+        filename = new_temp_audio_file(self.temp_dir)
+        temp_files.append(filename)
+        return filename
 
-            # 在线程池中执行合成
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, synthesize)
+    async def _render_with_hedge(self, text: str, job: SynthesisJob, temp_files: List[str]) -> str:
+        """
+        合成片段，返回音频文件路径
+        超过对冲阈值仍未完成且有空闲合成能力时，把同一片段再派发给另一个工作进程，
+        先成功完成的结果胜出，另一个被取消。
+        """
+        renders: Dict[asyncio.Future, str] = {}
 
-            # 流式读取音频文件
-            if os.path.exists(temp_filename):
-                with open(temp_filename, 'rb') as f:
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        yield chunk
-
-                self.logger.info("✅ 语音合成完成")
-            else:
-                self.logger.error("❌ 临时音频文件未生成")
-                yield b""
+        def launch() -> asyncio.Future:
+            filename = self._new_temp_file(temp_files)
+            task = asyncio.ensure_future(self._render_to_file(text, filename))
+            renders[task] = filename
+            return task
 
-        except Exception as e:
-            self.logger.error(f"❌ 语音合成过程中出错: {e}")
-            yield b""
+        primary = launch()
+        hedged = False
+        try:
+            delay = self._hedge_delay(job, len(text))
+            if delay is not None:
+                await asyncio.wait([primary], timeout=delay)
+                if not primary.done() and self.scheduler.try_acquire():
+                    hedged = True
+                    self._hedges["launched"] += 1
+                    self.logger.info(f"片段合成超过 {delay:.2f} 秒未完成，对冲派发到另一个工作进程")
+                    launch()
+
+            pending = set(renders)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedges["won"] += 1
+                        return renders[task]
+                if not pending:
+                    # 全部失败，抛出其中一个错误
+                    return done.pop().result()
         finally:
-            # 清理临时文件
-            if temp_filename and os.path.exists(temp_filename):
+            losers = [task for task in renders if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                # 等待落败的合成被终止，避免其在临时文件清理后继续写入
+                await asyncio.wait(losers)
+            if hedged:
+                self.scheduler.release()
+
+    @staticmethod
+    def _read_segment(filename: str) -> Tuple[WavFormat, memoryview]:
+        """读取合成出的片段文件，返回音频格式和PCM数据（阻塞调用，在线程池中执行）"""
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        if not data:
+            raise RuntimeError("临时音频文件未生成")
+        return parse_wav(data)
+
+    @classmethod
+    def _read_segments(cls, filenames: List[str]) -> List[Any]:
+        """一次读取多个片段文件，按顺序返回各片段的音频或异常（阻塞调用，在线程池中执行）"""
+        results: List[Any] = []
+        for filename in filenames:
+            try:
+                results.append(cls._read_segment(filename))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _remove_temp_files(self, temp_files: List[str]):
+        for temp_filename in temp_files:
+            if os.path.exists(temp_filename):
                 try:
                     os.unlink(temp_filename)
                 except Exception as e:
                     self.logger.warning(f"清理临时文件失败: {e}")
 
-    async def synthesize_and_stream(self, websocket, text: str, request_id: str):
+    def _should_batch(self, text: str, job: SynthesisJob) -> bool:
+        """
+        短片段在合成能力已占满（反正需要排队）或已有批次在收集时参与微批处理，
+        空闲时直接合成，不额外等待收集窗口
+        """
+        if not self.batcher or len(text) > settings.BATCH_MAX_CHARS:
+            return False
+        return self.batcher.has_pending(job.voice) or not self.scheduler.has_free_slot()
+
+    async def _render_segment(self, text: str, job: SynthesisJob) -> Tuple[WavFormat, memoryview]:
+        """合成单个文本片段，返回音频格式和PCM数据"""
+        if self._should_batch(text, job):
+            return await self.batcher.submit(job.voice, text, job)
+
+        if self.direct_pcm:
+            pcm = bytearray()
+            async with self.scheduler.slot(job, len(text)):
+                started = time.monotonic()
+                await self._render_pcm(text, pcm.extend)
+                self.cost_model.observe(job.voice, len(text), time.monotonic() - started)
+            job.remaining_chars = max(0, job.remaining_chars - len(text))
+            return self._pcm_format(), memoryview(bytes(pcm))
+
+        temp_files: List[str] = []
+        try:
+            async with self.scheduler.slot(job, len(text)):
+                started = time.monotonic()
+                temp_filename = await self._render_with_hedge(text, job, temp_files)
+                self.cost_model.observe(job.voice, len(text), time.monotonic() - started)
+            job.remaining_chars = max(0, job.remaining_chars - len(text))
+            # 文件读取放到线程池，事件循环只处理已就绪的数据
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._read_segment, temp_filename)
+        finally:
+            # 清理临时文件
+            self._remove_temp_files(temp_files)
+
+    async def _render_segment_progressive(self, text: str, job: SynthesisJob,
+                                          pieces: asyncio.Queue) -> Tuple[WavFormat, memoryview]:
+        """
+        合成片段，同时把已产生的音频陆续放入 pieces，全部放入后以 None 结束
+        直接输出PCM的后端在合成回调中逐块放入，其余后端跟随引擎正在写入的文件读取完整采样帧。
+        返回值中的PCM为空，音频只通过 pieces 输出。
+        """
+        try:
+            if not self.direct_pcm:
+                return await self._tail_segment(text, job, pieces)
+
+            async with self.scheduler.slot(job, len(text)):
+                started = time.monotonic()
+                await self._render_pcm(text, lambda pcm: pieces.put_nowait((self._pcm_format(), pcm)))
+                self.cost_model.observe(job.voice, len(text), time.monotonic() - started)
+            job.remaining_chars = max(0, job.remaining_chars - len(text))
+            return self._pcm_format(), memoryview(b"")
+        finally:
+            pieces.put_nowait(None)
+
+    async def _tail_segment(self, text: str, job: SynthesisJob,
+                            pieces: asyncio.Queue) -> Tuple[WavFormat, memoryview]:
+        """合成片段到临时文件，同时跟随引擎的写入把已写出的完整采样帧放入 pieces"""
+        loop = asyncio.get_event_loop()
+        temp_files: List[str] = []
+        try:
+            tail = WavTail(self._new_temp_file(temp_files))
+            async with self.scheduler.slot(job, len(text)):
+                started = time.monotonic()
+                render = asyncio.ensure_future(self._render_to_file(text, tail.path))
+                try:
+                    while not render.done():
+                        await asyncio.wait([render], timeout=settings.PROGRESSIVE_POLL_INTERVAL)
+                        pcm = await loop.run_in_executor(None, tail.read_available)
+                        if pcm:
+                            pieces.put_nowait((tail.fmt, pcm))
+                    render.result()
+                finally:
+                    if not render.done():
+                        render.cancel()
+                        await asyncio.wait([render])
+                self.cost_model.observe(job.voice, len(text), time.monotonic() - started)
+            job.remaining_chars = max(0, job.remaining_chars - len(text))
+
+            pcm = await loop.run_in_executor(None, tail.read_final)
+            if tail.fmt is None:
+                raise RuntimeError("临时音频文件未生成")
+            if pcm:
+                pieces.put_nowait((tail.fmt, pcm))
+            return tail.fmt, memoryview(b"")
+        finally:
+            self._remove_temp_files(temp_files)
+
+    async def _render_batch(self, items: List[BatchItem]) -> List[Any]:
+        """
+        在一次引擎运行中合成一批短片段，按顺序返回各片段的音频或异常
+        整批占用一个合成空位，调度属性取批内最紧急的优先级和最宽松的截止时间。
+        """
+        lead = items[0].job
+        batch_job = SynthesisJob(request_id=f"batch[{len(items)}]", priority=lead.priority,
+                                 deadline=lead.deadline, voice=lead.voice, tenant=lead.tenant)
+        for item in items[1:]:
+            batch_job.promote(item.job)
+        chars = sum(len(item.text) for item in items)
+        batch_job.remaining_chars = chars
+
+        temp_files: List[str] = []
+        try:
+            filenames = [self._new_temp_file(temp_files) for _ in items]
+            async with self.scheduler.slot(batch_job, chars):
+                for item in items:
+                    item.job.started = True
+                started = time.monotonic()
+                await self._render_to_files([(item.text, filename) for item, filename in zip(items, filenames)])
+                # 整批只有一次固定开销，耗时模型由此学到批处理的收益
+                self.cost_model.observe(batch_job.voice, chars, time.monotonic() - started)
+
+            for item in items:
+                item.job.remaining_chars = max(0, item.job.remaining_chars - len(item.text))
+            loop = asyncio.get_event_loop()
+            results = await loop.run_in_executor(None, self._read_segments, filenames)
+            self.logger.info(f"微批合成完成，片段数: {len(items)}，字符数: {chars}")
+            return results
+        finally:
+            self._remove_temp_files(temp_files)
+
+    async def _synthesize_stream(self, text: str, chunk_size: int, job: SynthesisJob) -> AsyncGenerator[bytes, None]:
+        """
+        分段并行合成文本
+        文本按句切分后在多个工作进程上并行合成，经重排缓冲区按原顺序输出，
+        输出为单个WAV头加各片段PCM数据的拼接。
+        开启渐进输出或使用直接输出PCM的后端时，首段在合成过程中就陆续输出，WAV头使用流式长度占位。
+        """
+        segments = split_text(text)
+        self.logger.info(f"🎵 开始合成语音，文本长度: {len(text)} 字符，分段数: {len(segments)}")
+
+        window = max(2, settings.SEGMENT_PARALLELISM or self._synthesis_capacity())
+        reorder = ReorderBuffer()
+        running: Dict[asyncio.Future, int] = {}
+        next_to_launch = 0
+        header_sent = False
+        progressive = settings.PROGRESSIVE_STREAMING or self.direct_pcm
+        first_pieces: Optional[asyncio.Queue] = asyncio.Queue() if progressive else None
+
+        try:
+            while reorder.next_index < len(segments):
+                # 在窗口内并行启动后续片段的合成，窗口以最早未输出的片段为起点
+                while next_to_launch < len(segments) and next_to_launch < reorder.next_index + window:
+                    segment = segments[next_to_launch]
+                    if next_to_launch == 0 and first_pieces is not None:
+                        coro = self._render_segment_progressive(segment, job, first_pieces)
+                    else:
+                        coro = self._render_segment(segment, job)
+                    running[asyncio.ensure_future(coro)] = next_to_launch
+                    next_to_launch += 1
+
+                if first_pieces is not None:
+                    # 首段合成完成前持续转发已写出的音频，后续片段同时在窗口内并行合成
+                    while (piece := await first_pieces.get()) is not None:
+                        fmt, pcm = piece
+                        if not header_sent:
+                            yield build_wav_header(fmt)
+                            header_sent = True
+                        for offset in range(0, len(pcm), chunk_size):
+                            yield pcm[offset:offset + chunk_size]
+                    first_pieces = None
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                ready = []
+                for task in sorted(done, key=running.get):
+                    ready.extend(reorder.put(running.pop(task), task.result()))
+
+                for fmt, pcm in ready:
+                    if not header_sent:
+                        # 单段时长度已知，多段时使用流式长度占位
+                        data_size = len(pcm) if len(segments) == 1 else None
+                        yield build_wav_header(fmt, data_size)
+                        header_sent = True
+
+                    for offset in range(0, len(pcm), chunk_size):
+                        yield bytes(pcm[offset:offset + chunk_size])
+        finally:
+            for task in running:
+                task.cancel()
+
+    def _store_on_disk(self, cache_key, audio: bytes):
+        """把合成结果写入磁盘缓存（在线程池中执行）"""
+        try:
+            self.disk_cache.put(cache_key, audio)
+        except Exception as e:
+            self.logger.warning(f"写入磁盘缓存失败: {e}")
+
+    async def _synthesize_and_cache(self, text: str, chunk_size: int, cache_key,
+                                    job: SynthesisJob) -> AsyncGenerator[bytes, None]:
+        """经准入控制后合成文本，并在完成后写入两级缓存；准入通过后先输出一个空块"""
+        job.remaining_chars = len(text)
+        ticket = self.scheduler.admit(job, len(text))
+        chunks = []
+        try:
+            # 让调用方在合成开始前就确认请求已被接受
+            yield b""
+            async with aclosing(self._synthesize_stream(text, chunk_size, job)) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+        finally:
+            ticket.release()
+
+        # 写入缓存前补全WAV头中的长度字段
+        audio = finalize_wav(b"".join(chunks))
+        self.audio_cache.put(cache_key, audio)
+        if self.disk_cache:
+            loop = asyncio.get_event_loop()
+            loop.run_in_executor(None, self._store_on_disk, cache_key, audio)
+        self.logger.info("✅ 语音合成完成")
+
+    async def text_to_speech_stream(self, text: str, chunk_size=settings.CHUNK_SIZE,
+                                    job: Optional[SynthesisJob] = None) -> AsyncGenerator[bytes, None]:
+        """
+        异步流式语音合成
+        依次查询内存缓存和磁盘缓存，命中时直接分块输出；未命中时分段合成，完成后写入两级缓存。
+        相同参数的并发请求只合成一次，所有请求共享输出。
+        需要合成时，通过准入控制后会先输出一个空块；被拒绝时在输出任何数据前抛出 SynthesisRejected。
+        Args:
+            text: 要合成的文本
+            chunk_size: 流式输出块大小
+            job: 调度属性（优先级等），默认为交互优先级
+        Yields:
+            音频数据块（bytes，磁盘缓存命中时为memoryview切片）
+        """
+        if not text or len(text.strip()) < 1:
+            yield b""
+            return
+
+        job = job or SynthesisJob()
+        job.voice = (self.voice_index, self.rate)
+        cache_key = make_cache_key(text, settings.TTS_BACKEND, self.voice_id, self.rate, self.volume)
+        cached = self.audio_cache.get(cache_key)
+        if cached is not None:
+            self.logger.info(f"⚡ 命中音频缓存，文本长度: {len(text)} 字符")
+            for offset in range(0, len(cached), chunk_size):
+                yield cached[offset:offset + chunk_size]
+            return
+
+        if self.disk_cache:
+            loop = asyncio.get_event_loop()
+            disk_entry = await loop.run_in_executor(None, self.disk_cache.get, cache_key)
+            if disk_entry is not None:
+                # 通过 mmap 切片直接输出，热点条目由操作系统页缓存承载
+                self.logger.info(f"⚡ 命中磁盘缓存，文本长度: {len(text)} 字符")
+                with disk_entry:
+                    for offset in range(0, len(disk_entry), chunk_size):
+                        yield disk_entry.view[offset:offset + chunk_size]
+                return
+
+        try:
+            # 相同参数的并发请求共享同一次合成
+            shared = self.single_flight.stream(
+                cache_key, lambda: self._synthesize_and_cache(text, chunk_size, cache_key, job), job)
+            async with aclosing(shared):
+                async for chunk in shared:
+                    yield chunk
+        except SynthesisRejected:
+            raise
+        except WorkerError as e:
+            # 引擎超时或崩溃：只让受影响的请求明确失败，而不是返回空音频
+            self.logger.error(f"❌ 合成引擎故障: {e}")
+            raise SynthesisFailed(f"合成引擎故障: {e}", timeout=isinstance(e, WorkerTimeout))
+        except Exception as e:
+            # 已输出的部分音频不完整，不能当作成功结束
+            self.logger.error(f"❌ 语音合成过程中出错: {e}")
+            raise SynthesisFailed(f"语音合成失败: {e}")
+
+    async def _send(self, websocket, message):
+        """
+        发送一条消息，速度由传输层写缓冲区的高/低水位控制
+        websocket.send 在缓冲区超过高水位时等待其回落到低水位；
+        超过 SEND_TIMEOUT 仍无法写出说明客户端过慢，放弃本次发送。
+        """
+        try:
+            await asyncio.wait_for(websocket.send(message), settings.SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"客户端接收过慢，发送超时({settings.SEND_TIMEOUT}秒)")
+
+    async def synthesize_and_stream(self, websocket, text: str, request_id: str,
+                                    audio_transport: str = AUDIO_TRANSPORT_JSON,
+                                    priority: str = PRIORITY_INTERACTIVE,
+                                    deadline: Optional[float] = None, tenant: str = ""):
         """
         合成语音并流式传输到WebSocket
         Args:
             websocket: WebSocket连接
             text: 要合成的文本
             request_id: 请求ID用于跟踪
+            audio_transport: 音频传输方式，json 为 base64 内嵌在JSON中，binary 为带固定头的二进制帧
+            priority: 调度优先级，interactive 或 background
+            deadline: 截止时间（事件循环时间），超过后排队中的片段被丢弃、进行中的合成被中止
+            tenant: 公平调度的租户键，同一租户的请求共享一份合成时间配额
         """
+        binary = audio_transport == AUDIO_TRANSPORT_BINARY
+        stream_id = next(self._stream_ids) & 0xFFFFFFFF
+        job = SynthesisJob(request_id=request_id, priority=priority, deadline=deadline, tenant=tenant)
+        total_size = 0
+        chunk_index = 0
+
+        start_message = {
+            "type": "synthesis_start",
+            "request_id": request_id,
+            "stream_id": stream_id,
+            "audio_transport": audio_transport,
+            "text_length": len(text)
+        }
+        start_sent = False
+
         try:
-            # 发送开始消息
-            start_message = {
-                "type": "synthesis_start",
-                "request_id": request_id,
-                "text_length": len(text),
-                "timestamp": asyncio.get_event_loop().time()
-            }
-            await websocket.send(json.dumps(start_message))
-
-            total_size = 0
-            chunk_index = 0
-
-            # 流式合成和发送音频
-            async for audio_chunk in self.text_to_speech_stream(text):
-                if not audio_chunk:
-                    continue
-
-                chunk_index += 1
-                total_size += len(audio_chunk)
-
-                # 编码音频数据
-                audio_base64 = base64.b64encode(audio_chunk).decode('utf-8')
-
-                # 发送音频块
-                chunk_message = {
-                    "type": "audio_chunk",
-                    "request_id": request_id,
-                    "chunk_index": chunk_index,
-                    "audio_data": audio_base64,
-                    "chunk_size": len(audio_chunk),
-                    "total_size": total_size,
-                    "is_final": False
-                }
-                await websocket.send(json.dumps(chunk_message))
-                await asyncio.sleep(0.001)  # 小延迟避免发送过快
+            # 流式合成和发送音频；超过截止时间后中止合成
+            deadline_scope = asyncio.timeout_at(job.deadline)
+            try:
+                async with deadline_scope, aclosing(self.text_to_speech_stream(text, job=job)) as stream:
+                    async for audio_chunk in stream:
+                        if not start_sent:
+                            # 开始消息在准入通过（或命中缓存）后才发送，被拒绝的请求只收到错误消息
+                            start_message["timestamp"] = asyncio.get_event_loop().time()
+                            await self._send(websocket, json.dumps(start_message))
+                            start_sent = True
+                        if not audio_chunk:
+                            continue
+
+                        chunk_index += 1
+                        total_size += len(audio_chunk)
+                        if settings.SEND_YIELD_EVERY_CHUNKS > 0 and chunk_index % settings.SEND_YIELD_EVERY_CHUNKS == 0:
+                            # 写缓冲区未满时 send 不会挂起，命中缓存时整段音频会在一步内发完，定期让出事件循环
+                            await asyncio.sleep(0)
+
+                        if binary:
+                            flags = FLAG_WAV_HEADER if chunk_index == 1 else 0
+                            await self._send(websocket, pack_audio_frame(stream_id, chunk_index, audio_chunk, flags))
+                            continue
+
+                        # 编码音频数据
+                        audio_base64 = base64.b64encode(audio_chunk).decode('utf-8')
+
+                        # 发送音频块
+                        chunk_message = {
+                            "type": "audio_chunk",
+                            "request_id": request_id,
+                            "chunk_index": chunk_index,
+                            "audio_data": audio_base64,
+                            "chunk_size": len(audio_chunk),
+                            "total_size": total_size,
+                            "is_final": False
+                        }
+                        await self._send(websocket, json.dumps(chunk_message))
+            except TimeoutError:
+                if not deadline_scope.expired():
+                    raise
+                stage = "synthesizing" if job.started or chunk_index else "queued"
+                self.logger.info(f"请求 {request_id} 超过截止时间，已中止({stage})")
+                raise DeadlineExceeded("请求已超过截止时间，合成被中止", stage=stage)
 
             # 发送结束消息
             end_message = {
@@ -166,10 +657,25 @@ class SpeechSynthesizer:
                 "total_size": total_size,
                 "timestamp": asyncio.get_event_loop().time()
             }
-            await websocket.send(json.dumps(end_message))
+            await self._send(websocket, json.dumps(end_message))
 
             self.logger.info(f"✅ 语音流式发送完成，请求ID: {request_id}, 总大小: {total_size} 字节")
 
+        except SynthesisRejected as e:
+            error_message = {
+                "type": "error",
+                "request_id": request_id,
+                "code": e.code,
+                "message": str(e),
+                **e.details,
+                "chunks_sent": chunk_index,
+                "timestamp": asyncio.get_event_loop().time()
+            }
+            try:
+                await self._send(websocket, json.dumps(error_message))
+            except Exception as send_error:
+                self.logger.warning(f"错误消息发送失败: {send_error}")
+
         except Exception as e:
             self.logger.error(f"❌ 流式音频发送失败: {e}")
             error_message = {
@@ -178,26 +684,54 @@ class SpeechSynthesizer:
                 "message": f"音频流发送失败: {str(e)}",
                 "timestamp": asyncio.get_event_loop().time()
             }
-            await websocket.send(json.dumps(error_message))
+            try:
+                await self._send(websocket, json.dumps(error_message))
+            except Exception as send_error:
+                self.logger.warning(f"错误消息发送失败: {send_error}")
 
     def get_voice_info(self) -> Dict[str, Any]:
         """获取语音合成器信息"""
-        voices = self.engine.getProperty('voices')
+        pool = self._engine_backend()
+        voices = pool.voices
         current_voice = voices[self.voice_index] if voices and len(voices) > self.voice_index else None
 
         return {
             "rate": self.rate,
             "volume": self.volume,
             "voice_index": self.voice_index,
-            "current_voice": current_voice.name if current_voice else "Unknown",
+            "current_voice": current_voice["name"] if current_voice else "Unknown",
             "available_voices": len(voices),
-            "voices": [{"id": i, "name": v.name} for i, v in enumerate(voices)]
+            "voices": voices,
+            "audio_cache": self.audio_cache.get_stats(),
+            "disk_cache": self.disk_cache.get_stats() if self.disk_cache else None,
+            "single_flight": self.single_flight.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "cost_model": self.cost_model.get_stats(),
+            "hedging": dict(self._hedges),
+            "batching": self.batcher.get_stats() if self.batcher else None,
+            "backend": settings.TTS_BACKEND,
+            self._engine_stats_key(): pool.get_stats()
         }
 
+    async def start(self):
+        """在事件循环中完成需要异步执行的初始化（预启动 espeak-ng 子进程）"""
+        if self.espeak_processes:
+            await self.espeak_processes.start()
+
     def stop(self):
         """停止语音合成器"""
         try:
-            self.engine.stop()
+            if self.worker_pool:
+                self.worker_pool.close()
+            if self.engine_pool:
+                self.engine_pool.close()
+            if self.espeak_engine:
+                self.espeak_engine.close()
+            if self.espeak_processes:
+                self.espeak_processes.close()
+            if self.disk_cache:
+                self.disk_cache.close()
+            self.temp_sweeper.stop()
             self.logger.info("语音合成器已停止")
         except:
             pass
\ No newline at end of file
@@ -0,0 +1,149 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# 流式输出时总长度未知，RIFF/data 长度字段按惯例填最大值
+STREAMING_SIZE = 0xFFFFFFFF
+
+
+class WavFormatError(Exception):
+    """WAV数据无法解析"""
+
+
+@dataclass(frozen=True)
+class WavFormat:
+    """PCM音频格式"""
+    channels: int = 1
+    sample_width: int = 2
+    framerate: int = 22050
+    audio_format: int = 1  # 1 = PCM
+
+    @property
+    def frame_size(self) -> int:
+        return self.channels * self.sample_width
+
+    @property
+    def byte_rate(self) -> int:
+        return self.framerate * self.frame_size
+
+
+def build_wav_header(fmt: WavFormat, data_size=None) -> bytes:
+    """
+    生成44字节的WAV文件头
+    Args:
+        fmt: 音频格式
+        data_size: PCM数据长度，None表示流式输出（长度未知）
+    """
+    if data_size is None:
+        riff_size = data_size = STREAMING_SIZE
+    else:
+        riff_size = min(36 + data_size, STREAMING_SIZE)
+
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', riff_size, b'WAVE',
+        b'fmt ', 16, fmt.audio_format, fmt.channels, fmt.framerate,
+        fmt.byte_rate, fmt.frame_size, fmt.sample_width * 8,
+        b'data', data_size
+    )
+
+
+def find_wav_data(data) -> Optional[Tuple[WavFormat, int, int]]:
+    """
+    定位WAV数据中的data块
+    Returns:
+        (音频格式, PCM起始偏移, data长度字段)；文件头尚未写完整时返回None
+    """
+    view = memoryview(data)
+    if len(view) < 12:
+        return None
+    if bytes(view[0:4]) != b'RIFF' or bytes(view[8:12]) != b'WAVE':
+        raise WavFormatError("不是有效的WAV数据")
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        chunk_size, = struct.unpack_from('<I', view, pos + 4)
+        body = pos + 8
+        if chunk_id == b'fmt ':
+            if body + 16 > len(view):
+                return None
+            audio_format, channels, framerate, _, _, bits = struct.unpack_from('<HHIIHH', view, body)
+            fmt = WavFormat(channels=channels, sample_width=bits // 8,
+                            framerate=framerate, audio_format=audio_format)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise WavFormatError("data块出现在fmt块之前")
+            return fmt, body, chunk_size
+        pos = body + chunk_size + (chunk_size & 1)
+
+    return None
+
+
+def parse_wav(data) -> Tuple[WavFormat, memoryview]:
+    """
+    解析WAV数据，返回音频格式和PCM数据视图（不复制）
+    data 长度字段为流式占位值或超出实际长度时，以实际数据为准。
+    """
+    view = memoryview(data)
+    located = find_wav_data(view)
+    if located is None:
+        if len(view) < 12:
+            raise WavFormatError("不是有效的WAV数据")
+        raise WavFormatError("WAV数据中缺少data块")
+
+    fmt, body, chunk_size = located
+    end = min(body + chunk_size, len(view))
+    # 只保留完整的采样帧
+    end -= (end - body) % fmt.frame_size
+    return fmt, view[body:end]
+
+
+class WavTail:
+    """
+    跟随引擎正在写入的WAV文件，增量读取已写出的完整采样帧
+    写入过程中文件头的长度字段通常还是0或占位值，因此以文件的实际大小为准。
+    读取方法都是阻塞调用，应在线程池中执行。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fmt: Optional[WavFormat] = None
+        self._data_offset = 0
+        self._emitted = 0  # 已读出的PCM字节数
+
+    def read_available(self) -> bytes:
+        """读取新写出的完整采样帧，尚无新数据时返回空字节串"""
+        try:
+            with open(self.path, 'rb') as f:
+                if self.fmt is None:
+                    located = find_wav_data(f.read(4096))
+                    if located is None:
+                        return b""
+                    self.fmt, self._data_offset, _ = located
+                f.seek(self._data_offset + self._emitted)
+                data = f.read()
+        except FileNotFoundError:
+            return b""
+
+        data = data[:len(data) - len(data) % self.fmt.frame_size]
+        self._emitted += len(data)
+        return data
+
+    def read_final(self) -> bytes:
+        """写入完成后读取剩余的PCM数据（以最终文件头的长度字段为准）"""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if not data:
+            return b""
+        self.fmt, pcm = parse_wav(data)
+        rest = pcm[self._emitted:].tobytes()
+        self._emitted += len(rest)
+        return rest
+
+
+def finalize_wav(data: bytes) -> bytes:
+    """把流式WAV（长度字段为占位值）改写为长度字段准确的完整WAV"""
+    fmt, pcm = parse_wav(data)
+    return build_wav_header(fmt, len(pcm)) + pcm.tobytes()
@@ -3,9 +3,12 @@ import websockets
 import json
 import logging
 import uuid
-from typing import Dict, Any
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, Any, Optional
 from config.settings import settings
 from core.tts import SpeechSynthesizer
+from core.scheduler import PRIORITY_CLASSES, PRIORITY_INTERACTIVE
+from core.protocol import AUDIO_TRANSPORT_JSON, AUDIO_TRANSPORTS, describe_binary_transport
 
 
 class TTSWebSocketServer:
@@ -19,10 +22,14 @@ class TTSWebSocketServer:
         connection_id = str(uuid.uuid4())
         self.active_connections[connection_id] = {
             'websocket': websocket,
-            'connected_at': asyncio.get_event_loop().time()
+            'connected_at': asyncio.get_event_loop().time(),
+            'audio_transport': AUDIO_TRANSPORT_JSON,
+            'tenant': self._resolve_tenant(websocket, path, connection_id),
+            'tasks': {}  # request_id -> 合成任务
         }
 
         self.logger.info(f"新的WebSocket连接: {connection_id}")
+        self._configure_flow_control(websocket)
 
         try:
             await self._send_welcome_message(websocket, connection_id)
@@ -35,10 +42,41 @@ class TTSWebSocketServer:
         except Exception as e:
             self.logger.error(f"处理连接时出错: {e}")
         finally:
-            if connection_id in self.active_connections:
-                del self.active_connections[connection_id]
+            connection = self.active_connections.pop(connection_id, None)
+            if connection:
+                # 连接断开后取消该连接上所有进行中的合成，立即释放合成资源
+                tasks = list(connection['tasks'].values())
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    await asyncio.wait(tasks)
+                    self.logger.info(f"已取消连接 {connection_id} 上的 {len(tasks)} 个合成任务")
             self.logger.info(f"连接清理完成: {connection_id}")
 
+    @staticmethod
+    def _resolve_tenant(websocket, path, connection_id: str) -> str:
+        """
+        确定连接所属的公平调度租户
+        优先使用 X-API-Key 请求头或 ?api_key= 查询参数，同一 API key 的多个连接共享配额；
+        未提供时每个连接单独作为一个租户。
+        """
+        headers = getattr(websocket, 'request_headers', None)
+        api_key = headers.get('X-API-Key') if headers is not None else None
+        if not api_key and path:
+            api_key = parse_qs(urlsplit(path).query).get('api_key', [None])[0]
+        return api_key or connection_id
+
+    def _configure_flow_control(self, websocket):
+        """设置传输层写缓冲区的高/低水位，发送端据此暂停和恢复"""
+        transport = getattr(websocket, 'transport', None)
+        if transport is None:
+            return
+        try:
+            transport.set_write_buffer_limits(high=settings.WS_WRITE_BUFFER_HIGH,
+                                              low=settings.WS_WRITE_BUFFER_LOW)
+        except Exception as e:
+            self.logger.warning(f"设置写缓冲区水位失败: {e}")
+
     async def _send_welcome_message(self, websocket, connection_id):
         """发送欢迎消息和服务器信息"""
         welcome_msg = {
@@ -47,6 +85,8 @@ class TTSWebSocketServer:
             "service": "流式语音合成服务",
             "version": "1.0.0",
             "supported_formats": ["wav"],
+            "audio_transports": list(AUDIO_TRANSPORTS),
+            "binary_frame": describe_binary_transport(),
             "voice_info": self.tts_engine.get_voice_info(),
             "timestamp": asyncio.get_event_loop().time()
         }
@@ -61,7 +101,16 @@ class TTSWebSocketServer:
             text = data.get('text', '')
 
             if message_type == 'synthesize':
-                await self._handle_synthesis_request(websocket, text, request_id)
+                audio_transport = data.get('audio_transport',
+                                           self.active_connections[connection_id]['audio_transport'])
+                priority = data.get('priority', PRIORITY_INTERACTIVE)
+                deadline_ms = data.get('deadline_ms')
+                await self._start_synthesis_task(websocket, text, request_id, audio_transport,
+                                                 priority, deadline_ms, connection_id)
+            elif message_type == 'cancel':
+                await self._handle_cancel(websocket, request_id, connection_id)
+            elif message_type == 'configure':
+                await self._handle_configure(websocket, data, request_id, connection_id)
             elif message_type == 'get_voices':
                 await self._send_voice_info(websocket, request_id)
             elif message_type == 'ping':
@@ -75,18 +124,121 @@ class TTSWebSocketServer:
             self.logger.error(f"处理消息时出错: {e}")
             await self._send_error(websocket, str(e), "error")
 
-    async def _handle_synthesis_request(self, websocket, text: str, request_id: str):
+    async def _start_synthesis_task(self, websocket, text: str, request_id: str,
+                                    audio_transport: str, priority: str, deadline_ms, connection_id: str):
+        """
+        把合成请求放到独立任务中执行
+        同一连接上的多个请求并发合成，音频块按 request_id/stream_id 交错发送；
+        消息循环不被阻塞，可以继续处理 cancel、ping 等控制消息。
+        """
+        connection = self.active_connections[connection_id]
+        deadline = None
+        if deadline_ms is not None:
+            if not isinstance(deadline_ms, (int, float)) or isinstance(deadline_ms, bool) or deadline_ms <= 0:
+                await self._send_error(websocket, f"无效的deadline_ms: {deadline_ms}", request_id)
+                return
+            # 截止时间从收到请求时开始计算
+            deadline = asyncio.get_event_loop().time() + deadline_ms / 1000
+
+        if request_id in connection['tasks']:
+            await self._send_error(websocket, f"请求ID已在处理中: {request_id}", request_id)
+            return
+
+        if len(connection['tasks']) >= settings.MAX_CONCURRENT_REQUESTS_PER_CONNECTION:
+            await self._send_error(
+                websocket,
+                f"并发请求数超过限制({settings.MAX_CONCURRENT_REQUESTS_PER_CONNECTION})",
+                request_id
+            )
+            return
+
+        async def run():
+            try:
+                await self._handle_synthesis_request(websocket, text, request_id, audio_transport,
+                                                     priority, deadline, connection['tenant'])
+            except asyncio.CancelledError:
+                self.logger.info(f"合成请求已取消: {request_id}")
+                raise
+            except Exception as e:
+                self.logger.error(f"处理合成请求时出错: {e}")
+                try:
+                    await self._send_error(websocket, str(e), request_id)
+                except Exception as send_error:
+                    self.logger.warning(f"错误消息发送失败: {send_error}")
+
+        def release(finished: asyncio.Task):
+            # 任务在开始执行前就被取消时 run() 不会运行，因此在完成回调中移除
+            if connection['tasks'].get(request_id) is finished:
+                del connection['tasks'][request_id]
+
+        task = asyncio.ensure_future(run())
+        task.add_done_callback(release)
+        connection['tasks'][request_id] = task
+
+    async def _handle_cancel(self, websocket, request_id: str, connection_id: str):
+        """取消本连接上进行中的合成请求"""
+        task = self.active_connections[connection_id]['tasks'].get(request_id)
+        if task is None:
+            await self._send_error(websocket, f"没有进行中的请求: {request_id}", request_id)
+            return
+
+        task.cancel()
+        # 等待任务退出，保证确认消息之后不会再有该请求的音频块
+        await asyncio.wait([task])
+        response = {
+            "type": "synthesis_cancelled",
+            "request_id": request_id,
+            "timestamp": asyncio.get_event_loop().time()
+        }
+        await websocket.send(json.dumps(response))
+
+    async def _handle_configure(self, websocket, data: Dict[str, Any], request_id: str, connection_id: str):
+        """处理连接级配置，例如协商音频传输方式"""
+        connection = self.active_connections[connection_id]
+        audio_transport = data.get('audio_transport', connection['audio_transport'])
+        if audio_transport not in AUDIO_TRANSPORTS:
+            await self._send_error(websocket, f"不支持的音频传输方式: {audio_transport}", request_id)
+            return
+
+        connection['audio_transport'] = audio_transport
+        self.logger.info(f"连接 {connection_id} 音频传输方式: {audio_transport}")
+        response = {
+            "type": "configured",
+            "request_id": request_id,
+            "audio_transport": audio_transport,
+            "timestamp": asyncio.get_event_loop().time()
+        }
+        await websocket.send(json.dumps(response))
+
+    async def _handle_synthesis_request(self, websocket, text: str, request_id: str,
+                                        audio_transport: str = AUDIO_TRANSPORT_JSON,
+                                        priority: str = PRIORITY_INTERACTIVE,
+                                        deadline: Optional[float] = None, tenant: str = ""):
         """处理语音合成请求"""
+        for name, value in (("text", text), ("priority", priority), ("audio_transport", audio_transport)):
+            if not isinstance(value, str):
+                await self._send_error(websocket, f"{name} 必须是字符串", request_id)
+                return
+
         if not text or len(text.strip()) == 0:
             await self._send_error(websocket, "文本内容不能为空", request_id)
             return
 
+        if audio_transport not in AUDIO_TRANSPORTS:
+            await self._send_error(websocket, f"不支持的音频传输方式: {audio_transport}", request_id)
+            return
+
+        if priority not in PRIORITY_CLASSES:
+            await self._send_error(websocket, f"不支持的优先级: {priority}", request_id)
+            return
+
         if len(text) > 10000:  # 限制文本长度
             await self._send_error(websocket, "文本长度超过限制(10000字符)", request_id)
             return
 
         self.logger.info(f"开始处理合成请求: {request_id}, 文本长度: {len(text)}")
-        await self.tts_engine.synthesize_and_stream(websocket, text, request_id)
+        await self.tts_engine.synthesize_and_stream(websocket, text, request_id, audio_transport,
+                                                    priority, deadline, tenant)
 
     async def _send_voice_info(self, websocket, request_id: str):
         """发送语音信息"""
@@ -121,12 +273,14 @@ class TTSWebSocketServer:
     async def start_server(self):
         """启动WebSocket服务器"""
         self.logger.info(f"启动TTS WebSocket服务器: {settings.HOST}:{settings.PORT}")
+        await self.tts_engine.start()
 
         async with websockets.serve(
                 self.handle_connection,
                 settings.HOST,
                 settings.PORT,
-                max_size=settings.MAX_MESSAGE_SIZE
+                max_size=settings.MAX_MESSAGE_SIZE,
+                write_limit=settings.WS_WRITE_BUFFER_HIGH
         ):
             self.logger.info("TTS服务器已启动，等待连接...")
             await asyncio.Future()  # 永久运行
@@ -0,0 +1,428 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from config.settings import settings
+from core.espeak_backend import BACKEND_ESPEAK, BACKEND_PYTTSX3
+from core.wav import WavFormat
+
+
+class WorkerError(Exception):
+    """工作进程合成失败"""
+
+
+class WorkerTimeout(WorkerError):
+    """合成任务超时，执行它的工作进程已被终止"""
+
+
+def job_timeout(chars: int) -> float:
+    """单个合成任务的超时时间（秒），随文本长度增加"""
+    return settings.WORKER_JOB_TIMEOUT + chars * settings.WORKER_JOB_TIMEOUT_PER_CHAR
+
+
+def _current_rss() -> int:
+    """当前进程的常驻内存（字节），无法获取时返回0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+        # 非 Linux 平台退化为峰值内存，macOS 单位为字节，其余为KB
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def _worker_main(conn, rate, volume, voice_index, temp_dir, backend):
+    """工作进程入口：持有独立的引擎，循环处理父进程派发的合成任务"""
+    # 驱动内部的中间文件也写到内存文件系统中
+    tempfile.tempdir = temp_dir
+
+    try:
+        if backend == BACKEND_ESPEAK:
+            from core.espeak_backend import EspeakEngine
+            engine_pool = EspeakEngine(rate=rate, volume=volume, voice_index=voice_index)
+            audio_format = engine_pool.format
+        else:
+            from core.engine_pool import EnginePool
+            engine_pool = EnginePool(size=1, rate=rate, volume=volume, voice_index=voice_index)
+            audio_format = None
+    except Exception as e:
+        conn.send({"type": "failed", "error": str(e)})
+        return
+
+    conn.send({"type": "ready", "voices": engine_pool.voices, "format": audio_format})
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+
+        try:
+            if "text" in job:
+                # 直接输出PCM的后端：合成过程中逐块回传，不经过文件
+                engine_pool.synthesize(job["text"], lambda pcm: conn.send({"type": "pcm", "data": pcm}))
+            else:
+                with engine_pool.engine() as engine:
+                    # 一个任务可以包含多段文本，排入同一次引擎运行，分别写入各自的文件
+                    for text, path in job["items"]:
+                        engine.save_to_file(text, path)
+                    engine.runAndWait()
+            conn.send({"type": "done", "ok": True, "rss": _current_rss()})
+        except Exception as e:
+            conn.send({"type": "done", "ok": False, "error": str(e), "rss": _current_rss()})
+
+    engine_pool.close()
+
+
+class SynthesisWorker:
+    """单个合成工作进程的父进程端句柄"""
+
+    def __init__(self, worker_id: int, ctx, rate, volume, voice_index, temp_dir, backend):
+        self.worker_id = worker_id
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, rate, volume, voice_index, temp_dir, backend),
+            name=f"tts-worker-{worker_id}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.jobs = 0
+        self.rss = 0  # 最近一次任务完成时上报的常驻内存（字节）
+        self.retired = False  # 已终止或等待替换，不能再接收任务
+        self.recycling = False  # 替代进程正在启动，就绪后本进程平滑退出
+
+    def wait_ready(self, timeout: float) -> Dict[str, Any]:
+        """阻塞等待工作进程完成引擎初始化"""
+        if not self.conn.poll(timeout):
+            raise WorkerError(f"工作进程 {self.worker_id} 启动超时")
+        try:
+            message = self.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerError(f"工作进程 {self.worker_id} 初始化期间退出(exitcode={self.process.exitcode})")
+        if message.get("type") != "ready":
+            raise WorkerError(f"工作进程 {self.worker_id} 启动失败: {message.get('error')}")
+        return message
+
+    def send(self, job: Dict[str, Any]):
+        """发送任务（任务消息很小，可在事件循环中直接调用）"""
+        try:
+            self.conn.send(job)
+        except OSError:
+            raise WorkerError(f"工作进程 {self.worker_id} 意外退出(exitcode={self.process.exitcode})")
+
+    def receive(self, on_pcm: Optional[Callable[[bytes], None]] = None) -> Dict[str, Any]:
+        """阻塞等待任务结果（在线程池中调用），合成过程中回传的PCM数据块交给 on_pcm"""
+        try:
+            while True:
+                message = self.conn.recv()
+                if message.get("type") != "pcm":
+                    return message
+                on_pcm(message["data"])
+        except (EOFError, OSError):
+            raise WorkerError(f"工作进程 {self.worker_id} 意外退出(exitcode={self.process.exitcode})")
+
+    def kill(self):
+        """强制终止进程（用于中断正在执行的任务）"""
+        self.retired = True
+        self.process.terminate()
+
+    def shutdown(self, timeout: float = 2.0):
+        """通知工作进程退出，超时则强制终止"""
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+
+
+class SynthesisWorkerPool:
+    """
+    多进程合成工作池
+    每个工作进程拥有自己的引擎，事件循环把任务派发给空闲进程，从而利用多核并行合成。
+    每个任务都有超时时间，卡住的进程被强制终止；退出或被终止的进程在后台自动重启，
+    只有受影响的请求失败，其余进程继续服务。
+    进程处理的任务数或内存超过上限时被轮换：先启动替代进程，旧进程在完成当前任务后退出。
+    """
+
+    def __init__(self, size=settings.WORKER_COUNT, rate=settings.RATE, volume=settings.VOLUME,
+                 voice_index=settings.VOICE_INDEX, temp_dir=None, backend=BACKEND_PYTTSX3):
+        self.size = max(1, size)
+        self.backend = backend
+        self.format: Optional[WavFormat] = None  # 直接输出PCM的后端的音频格式
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self.rate = rate
+        self.volume = volume
+        self.voice_index = voice_index
+        self.logger = logging.getLogger(__name__)
+        self.voices: List[Dict[str, Any]] = []
+        # spawn 在所有平台上行为一致，也避免 fork 时复制事件循环和线程状态
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "asyncio.Queue[SynthesisWorker]" = asyncio.Queue()
+        self._workers: Dict[int, SynthesisWorker] = {}
+        self._next_id = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._timeouts = 0
+        self._crashed = 0
+        self._recycled = 0
+        self._restart_failures = 0
+        self._closed = False
+        # 等待任务结果的线程独立于默认线程池，不与文件读取、进程启动等操作争用；
+        # 轮换期间新旧进程可能同时忙碌，按进程数的两倍准备
+        self._executor = ThreadPoolExecutor(max_workers=self.size * 2, thread_name_prefix="tts-worker-io")
+
+        # 先同时启动全部进程，再逐个等待就绪，避免引擎初始化串行叠加
+        workers = [self._start_worker() for _ in range(self.size)]
+        try:
+            for worker in workers:
+                self._register_worker(worker)
+                self._idle.put_nowait(worker)
+        except Exception:
+            # 已启动的进程不能遗留
+            for worker in workers:
+                worker.shutdown(timeout=0)
+            self._executor.shutdown(wait=False)
+            raise
+
+        self.logger.info(f"✓ 合成工作池初始化完成，进程数: {self.size}")
+
+    def _start_worker(self) -> SynthesisWorker:
+        """启动一个新的工作进程（不等待就绪）"""
+        self._next_id += 1
+        return SynthesisWorker(self._next_id, self._ctx, self.rate, self.volume, self.voice_index,
+                               self.temp_dir, self.backend)
+
+    def _spawn_worker(self) -> SynthesisWorker:
+        """启动一个新的工作进程并等待其就绪"""
+        worker = self._start_worker()
+        self._register_worker(worker)
+        return worker
+
+    def _register_worker(self, worker: SynthesisWorker):
+        """等待工作进程就绪并登记"""
+        try:
+            ready = worker.wait_ready(settings.WORKER_START_TIMEOUT)
+        except Exception:
+            worker.shutdown(timeout=0)
+            raise
+
+        self.format = ready.get("format")
+        if not self.voices:
+            self.voices = ready.get("voices", [])
+            self.logger.info(f"可用语音数量: {len(self.voices)}")
+            for voice in self.voices:
+                self.logger.info(f"语音 {voice['id']}: {voice['name']}")
+
+        self._workers[worker.worker_id] = worker
+        self.logger.info(f"工作进程已启动: {worker.worker_id} (pid={worker.process.pid})")
+
+    async def render(self, text: str, path: str):
+        """把文本合成到指定文件，由空闲工作进程执行"""
+        await self.render_batch([(text, path)])
+
+    async def render_batch(self, items: List[Tuple[str, str]]):
+        """
+        把多段文本在一次引擎运行中分别合成到各自的文件，由空闲工作进程执行
+        Args:
+            items: (文本, 输出文件路径) 列表
+        Raises:
+            WorkerTimeout: 任务超时，工作进程已被终止
+            WorkerError: 工作进程合成失败或意外退出
+        """
+        await self._run_job({"items": items}, sum(len(text) for text, _ in items))
+
+    async def render_pcm(self, text: str, on_pcm: Callable[[bytes], None]):
+        """
+        由直接输出PCM的后端合成文本，PCM数据块在合成过程中依次交给 on_pcm（在线程池线程中调用）
+        Raises:
+            WorkerTimeout: 任务超时，工作进程已被终止
+            WorkerError: 工作进程合成失败或意外退出
+        """
+        await self._run_job({"text": text}, len(text), on_pcm)
+
+    async def _run_job(self, job: Dict[str, Any], chars: int, on_pcm: Optional[Callable[[bytes], None]] = None):
+        """把任务派发给空闲工作进程并等待完成"""
+        timeout = job_timeout(chars)
+        try:
+            # 进程重启持续失败时空闲队列可能一直为空，等待同样受任务超时限制
+            async with asyncio.timeout(timeout):
+                worker = await self._acquire_worker()
+        except TimeoutError:
+            self._failed += 1
+            self.logger.error(f"❌ {timeout:.1f}秒内没有可用的工作进程")
+            raise WorkerTimeout(f"等待工作进程超时({timeout:.1f}秒)")
+        busy = self.size - self._idle.qsize()
+        self.logger.info(f"派发任务到工作进程 {worker.worker_id}，工作池使用率: {busy}/{self.size}")
+
+        loop = asyncio.get_running_loop()
+        try:
+            # 超时从任务真正发给工作进程时开始计算
+            worker.send(job)
+            async with asyncio.timeout(timeout):
+                result = await loop.run_in_executor(self._executor, worker.receive, on_pcm)
+            worker.jobs += 1
+            worker.rss = result.get("rss", 0)
+        except TimeoutError:
+            # 引擎卡住（例如 espeak 停滞），终止进程后由后台重启，避免长期占用工作位
+            self.logger.error(f"❌ 工作进程 {worker.worker_id} 合成超时({timeout:.1f}秒)，强制终止")
+            worker.kill()
+            self._timeouts += 1
+            self._failed += 1
+            raise WorkerTimeout(f"合成超时({timeout:.1f}秒)，工作进程已重启")
+        except asyncio.CancelledError:
+            # 引擎阻塞在合成中无法响应消息，直接终止进程以立即释放该工作位
+            self.logger.info(f"终止工作进程 {worker.worker_id} 上被取消的任务")
+            worker.kill()
+            self._cancelled += 1
+            raise
+        except WorkerError:
+            # 管道已断开，进程可能尚未完全退出，确保不再被派发任务
+            worker.kill()
+            self._crashed += 1
+            self._failed += 1
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._return_worker(worker)
+
+        if not result.get("ok"):
+            self._failed += 1
+            raise WorkerError(result.get("error", "未知错误"))
+
+        self._completed += 1
+
+    async def _acquire_worker(self) -> SynthesisWorker:
+        """取出一个空闲工作进程，空闲期间已退出的进程交给后台重启"""
+        while True:
+            worker = await self._idle.get()
+            if worker.process.is_alive() and not worker.retired:
+                return worker
+            if not worker.retired:
+                self.logger.warning(f"⚠️ 空闲工作进程 {worker.worker_id} 已退出(exitcode={worker.process.exitcode})")
+                self._crashed += 1
+            self._return_worker(worker)
+
+    def _return_worker(self, worker: SynthesisWorker):
+        """归还工作进程；已退出或被终止的进程在后台替换，达到轮换条件的进程开始轮换"""
+        if worker.process.is_alive() and not worker.retired:
+            reason = self._recycle_reason(worker)
+            if reason and not worker.recycling:
+                worker.recycling = True
+                asyncio.ensure_future(self._recycle_worker(worker, reason))
+            self._idle.put_nowait(worker)
+            return
+
+        self._workers.pop(worker.worker_id, None)
+        if worker.recycling:
+            # 替代进程已经在启动或已就绪，只需让本进程退出
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, worker.shutdown)
+        else:
+            asyncio.ensure_future(self._replace_worker(worker))
+
+    @staticmethod
+    def _recycle_reason(worker: SynthesisWorker) -> str:
+        """工作进程需要轮换的原因，无需轮换时返回空字符串"""
+        if settings.WORKER_MAX_JOBS > 0 and worker.jobs >= settings.WORKER_MAX_JOBS:
+            return f"已处理 {worker.jobs} 个任务"
+        max_rss = settings.WORKER_MAX_RSS_MB * 1024 * 1024
+        if max_rss > 0 and worker.rss > max_rss:
+            return f"内存占用 {worker.rss // (1024 * 1024)}MB"
+        return ""
+
+    async def _recycle_worker(self, worker: SynthesisWorker, reason: str):
+        """
+        轮换工作进程
+        替代进程就绪前旧进程继续服务；就绪后旧进程不再接收任务，空闲时立即退出，忙碌时完成当前任务后退出。
+        """
+        self.logger.info(f"♻️ 轮换工作进程 {worker.worker_id}: {reason}")
+        loop = asyncio.get_running_loop()
+        try:
+            replacement = await loop.run_in_executor(None, self._spawn_worker)
+        except Exception as e:
+            self.logger.error(f"❌ 替代进程启动失败: {e}")
+            worker.recycling = False
+            if worker.retired:
+                # 等待期间旧进程已被终止，改为普通重启
+                asyncio.ensure_future(self._replace_worker(worker))
+            return
+
+        worker.retired = True
+        self._recycled += 1
+        self._idle.put_nowait(replacement)
+        # 旧进程若在空闲队列中则立即移出并退出
+        for _ in range(self._idle.qsize()):
+            idle = self._idle.get_nowait()
+            if idle is worker:
+                self._return_worker(idle)
+            else:
+                self._idle.put_nowait(idle)
+
+    async def _replace_worker(self, worker: SynthesisWorker):
+        """回收退出的工作进程并启动替代进程，启动失败时按指数退避重试，直到成功或工作池关闭"""
+        self.logger.warning(f"⚠️ 工作进程 {worker.worker_id} 已退出，正在重启")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, worker.shutdown, 0.5)
+        delay = settings.WORKER_RESTART_BACKOFF
+        while not self._closed:
+            try:
+                replacement = await loop.run_in_executor(None, self._spawn_worker)
+            except Exception as e:
+                self._restart_failures += 1
+                self.logger.error(f"❌ 工作进程重启失败，{delay:.1f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.WORKER_RESTART_BACKOFF_MAX)
+                continue
+            if self._closed:
+                replacement.shutdown(timeout=0)
+                return
+            self._idle.put_nowait(replacement)
+            return
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取工作池使用情况"""
+        idle = self._idle.qsize()
+        return {
+            "size": self.size,
+            "busy": self.size - idle,
+            "idle": idle,
+            "utilization": round((self.size - idle) / self.size, 3),
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "timeouts": self._timeouts,
+            "crashed": self._crashed,
+            "recycled": self._recycled,
+            "restart_failures": self._restart_failures,
+            "max_rss_bytes": max((w.rss for w in self._workers.values()), default=0)
+        }
+
+    def close(self):
+        """关闭所有工作进程"""
+        self._closed = True
+        for worker in list(self._workers.values()):
+            worker.shutdown()
+        self._workers.clear()
+        self._executor.shutdown(wait=False)
+        self.logger.info("合成工作池已关闭")